@@ -10,4 +10,6 @@ admin.site.register([  Profile,
     Customer,
     Sale,
     SaleItem,
-    Expense])
\ No newline at end of file
+    Expense,
+    DailyShopStats,
+    DailyProductStats])
\ No newline at end of file
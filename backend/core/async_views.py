@@ -0,0 +1,114 @@
+"""
+Async report endpoints for ASGI servers (shopmate/asgi.py).
+
+A report spends nearly all of its time waiting on the database. Under ASGI
+these views give the event loop back while they wait, so one worker keeps
+serving other requests, and the dashboard's independent aggregates run at
+the same time instead of one after another. They work under WSGI too, just
+without either benefit.
+
+Django's async ORM runs every query on one shared thread, so each aggregate
+gets its own executor thread (and database connection) instead.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.timezone import localdate
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .db_router import replica_allowed, replica_reads
+from .reports import cached_report_summary, low_stock_count, pending_sale_count, report_params, today_totals
+from .utils import Tenant, get_request_tenant
+
+
+def _run_and_close(func, args):
+    try:
+        return func(*args)
+    finally:
+        # executor threads outlive the request, so don't leave connections open in them
+        connections.close_all()
+
+
+async def gather_in_threads(**calls):
+    """
+    Run the (func, *args) values in parallel executor threads and return
+    their results under the same keys.
+    """
+    results = await asyncio.gather(*(
+        sync_to_async(_run_and_close, thread_sensitive=False)(func, args)
+        for func, *args in calls.values()
+    ))
+    return dict(zip(calls, results))
+
+
+def _authenticate(request):
+    # same authentication classes, and IsAuthenticated, as the DRF views
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        if not drf_request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+    except exceptions.APIException as exc:
+        response = JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        authenticate_header = drf_request.authenticators[0].authenticate_header(drf_request)
+        if authenticate_header:
+            response["WWW-Authenticate"] = authenticate_header
+        else:
+            response.status_code = 403
+        return None, response
+    # request.tenant is lazy; resolve it here rather than on the event loop
+    return Tenant._make(get_request_tenant(request)), None
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder)
+
+
+@require_GET
+async def report_summary_view(request):
+    """
+    GET: async ReportSummary, same parameters and response.
+    """
+    tenant, error = await sync_to_async(_authenticate)(request)
+    if error:
+        return error
+    shop, branch, _ = tenant
+    if not shop:
+        return _json({"detail": "No shop found"}, status=404)
+
+    timeframe, granularity = report_params(request.GET)
+    with replica_reads(await sync_to_async(replica_allowed)(request, shop)):
+        data = await sync_to_async(cached_report_summary)(shop, branch, timeframe, granularity)
+    return _json(data)
+
+
+@require_GET
+async def dashboard_view(request):
+    """
+    GET: everything the dashboard shows in one response: the report summary
+    (same parameters as ReportSummary), today's totals, pending sales and the
+    number of low-stock products.
+    """
+    tenant, error = await sync_to_async(_authenticate)(request)
+    if error:
+        return error
+    shop, branch, _ = tenant
+    if not shop:
+        return _json({"detail": "No shop found"}, status=404)
+
+    timeframe, granularity = report_params(request.GET)
+    # the context (and with it the replica choice) is copied into every thread
+    with replica_reads(await sync_to_async(replica_allowed)(request, shop)):
+        data = await gather_in_threads(
+            summary=(cached_report_summary, shop, branch, timeframe, granularity),
+            today=(today_totals, shop, branch),
+            pending_sales=(pending_sale_count, shop, branch),
+            low_stock_products=(low_stock_count, shop, branch),
+        )
+    data["date"] = localdate().isoformat()
+    return _json(data)
@@ -0,0 +1,200 @@
+import copy
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Branch, Shop
+from .utils import NO_TENANT, Tenant, get_user_tenant
+
+# shared cache entries are evicted on logout; process-local ones in other
+# workers can only expire, so keep their lifetime short
+TOKEN_CACHE_TIMEOUT = getattr(settings, "TOKEN_CACHE_TIMEOUT", 300)
+TOKEN_LOCAL_CACHE_TIMEOUT = getattr(settings, "TOKEN_LOCAL_CACHE_TIMEOUT", 10)
+TOKEN_LOCAL_CACHE_SIZE = getattr(settings, "TOKEN_LOCAL_CACHE_SIZE", 1024)
+
+
+class LocalTTLCache:
+    """
+    Small thread-safe LRU cache whose entries also expire after `timeout` seconds.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LocalTTLCache(TOKEN_LOCAL_CACHE_SIZE, TOKEN_LOCAL_CACHE_TIMEOUT)
+
+
+def token_cache_key(key):
+    # never put the raw token into cache keys
+    return "core:token:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+def evict_tokens(keys):
+    cache_keys = [token_cache_key(key) for key in keys]
+    for cache_key in cache_keys:
+        local_tokens.delete(cache_key)
+    if cache_keys:
+        cache.delete_many(cache_keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in TokenAuthentication that remembers token -> user for a while, first
+    in the process and then in the shared Django cache, so most requests skip
+    the Token + User query. Tokens are evicted when they are deleted (djoser
+    logout) or their user changes; see core.signals.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        token = local_tokens.get(cache_key)
+        if token is None:
+            token = cache.get(cache_key)
+            if token is None:
+                _user, token = super().authenticate_credentials(key)
+                cache.set(cache_key, token, TOKEN_CACHE_TIMEOUT)
+            local_tokens.set(cache_key, token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        # requests must not share (and mutate) the cached instance
+        user = copy.copy(token.user)
+        return (user, token)
+
+
+def tenant_claims(user):
+    shop, branch, role = get_user_tenant(user)
+    return {
+        "shop_id": str(shop.pk) if shop else None,
+        "branch_id": str(branch.pk) if branch else None,
+        "role": role,
+    }
+
+
+def tenant_from_claims(token):
+    """
+    Tenant rebuilt from access token claims without touching the database.
+    Shop and branch are instances with only their ids loaded; any other field
+    is fetched on first access.
+    """
+    if "role" not in token:
+        return None  # token issued before tenant claims existed
+    if not token["shop_id"]:
+        return NO_TENANT
+    shop_id = uuid.UUID(token["shop_id"])
+    shop = Shop.from_db(DEFAULT_DB_ALIAS, ["id"], [shop_id])
+    branch = None
+    if token["branch_id"]:
+        branch = Branch.from_db(DEFAULT_DB_ALIAS, ["id", "shop_id"], [uuid.UUID(token["branch_id"]), shop_id])
+    return Tenant(shop, branch, token["role"])
+
+
+def revoked_access_key(jti):
+    return f"core:jwt:revoked:{jti}"
+
+
+def revoke_access_token(token):
+    # refresh tokens go to simplejwt's blacklist table; access tokens are short
+    # lived, so a cache entry until they expire is enough
+    remaining = int(token["exp"] - time.time())
+    if remaining > 0:
+        cache.set(revoked_access_key(token[jwt_settings.JTI_CLAIM]), True, remaining)
+
+
+class TenantRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry shop_id, branch_id and role. The
+    claims are resolved again on every refresh, so membership changes reach
+    clients within one access token lifetime.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["username"] = user.get_username()
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        User = get_user_model()
+        # the tenant lookup only needs the primary key
+        user = User(pk=User._meta.pk.to_python(self[jwt_settings.USER_ID_CLAIM]))
+        for claim, value in tenant_claims(user).items():
+            access[claim] = value
+        return access
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    Stateless JWT authentication: the user and tenant come from the access
+    token claims, so neither costs a query.
+
+    request.user is a User with only id and username loaded; other fields load
+    on first access and save() only writes loaded fields.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if cache.get(revoked_access_key(token[jwt_settings.JTI_CLAIM])):
+            raise InvalidToken(_("Token has been revoked"))
+        return token
+
+    def get_user(self, validated_token):
+        User = get_user_model()
+        try:
+            user_id = User._meta.pk.to_python(validated_token[jwt_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = User.from_db(
+            DEFAULT_DB_ALIAS, [User._meta.pk.attname, User.USERNAME_FIELD],
+            [user_id, validated_token.get("username", "")],
+        )
+        user.jwt_tenant = tenant_from_claims(validated_token)
+        return user
@@ -0,0 +1,136 @@
+"""
+Delta sync of the product catalog for POS clients (GET /api/products/sync/).
+
+Instead of downloading every product on each start, a terminal keeps the
+catalog locally and asks for what changed since its last sync token: the
+products whose updated_at moved past the token, and the ids of products
+deleted since (ProductTombstone). Both are walked in (timestamp, id) order,
+so a large first sync arrives in pages that each continue exactly where
+the previous one stopped.
+
+Rows are written with timestamps taken before their transaction commits,
+so a caught-up token is set CATALOG_SYNC_OVERLAP seconds back. The next
+sync may then return a few products again; clients apply the changes as
+upserts. Tombstones are kept for CATALOG_TOMBSTONE_TTL seconds; a token
+whose tombstone position is older than that gets ``reset`` and the whole
+catalog again.
+"""
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ProductTombstone
+
+CATALOG_SYNC_OVERLAP = getattr(settings, "CATALOG_SYNC_OVERLAP", 60)
+CATALOG_TOMBSTONE_TTL = getattr(settings, "CATALOG_TOMBSTONE_TTL", 30 * 24 * 3600)
+CATALOG_SYNC_PAGE_SIZE = getattr(settings, "CATALOG_SYNC_PAGE_SIZE", 500)
+CATALOG_SYNC_MAX_PAGE_SIZE = getattr(settings, "CATALOG_SYNC_MAX_PAGE_SIZE", 2000)
+
+PRODUCT_SYNC_FIELDS = ["id", "name", "category_id", "cost_price", "selling_price", "quantity", "image", "updated_at"]
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def encode_token(products, deleted):
+    """
+    Opaque token for the (timestamp, id) positions of both streams; an id of
+    None means "everything from this timestamp on".
+    """
+    data = {
+        name: [ts.isoformat(), str(pk) if pk is not None else None]
+        for name, (ts, pk) in (("p", products), ("d", deleted))
+    }
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode()
+
+
+def decode_token(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+        positions = []
+        for name in ("p", "d"):
+            ts, pk = data[name]
+            ts = datetime.fromisoformat(ts)
+            if timezone.is_naive(ts):
+                raise ValueError("naive timestamp")
+            positions.append((ts, uuid.UUID(pk) if pk is not None else None))
+    except (binascii.Error, UnicodeError, KeyError, TypeError, ValueError) as exc:
+        raise InvalidSyncToken("Invalid sync token.") from exc
+    return positions
+
+
+def _page(queryset, field, position, limit, settled):
+    """
+    Up to ``limit`` rows after ``position`` in (field, id) order, whether more
+    follow, and the position to continue from. Once caught up that is
+    ``settled``, even if it is before rows already returned.
+    """
+    if position is not None:
+        ts, pk = position
+        if pk is None:
+            queryset = queryset.filter(**{f"{field}__gte": ts})
+        else:
+            queryset = queryset.filter(Q(**{f"{field}__gt": ts}) | Q(**{field: ts, "pk__gt": pk}))
+    rows = list(queryset.order_by(field, "pk")[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    if more:
+        return rows, more, (getattr(rows[-1], field), rows[-1].pk)
+    # caught up: continue from a little while ago, to cover rows whose transactions had not committed yet
+    return rows, more, (settled, None)
+
+
+def catalog_changes(products, shop, branch, token=None, limit=CATALOG_SYNC_PAGE_SIZE):
+    """
+    Products of the ``products`` queryset changed since ``token``, ids of the
+    tenant's products deleted since, and the next token. Without a token, or
+    with one older than the tombstones, ``reset`` is set and the whole
+    catalog is returned: the client should drop what it has.
+    """
+    now = timezone.now()
+    positions = decode_token(token) if token else None
+    # only the tombstone position expires: the product position of a paged sync may be long
+    # in the past, and products are not purged
+    reset = positions is None or positions[1][0] < now - timedelta(seconds=CATALOG_TOMBSTONE_TTL)
+    if reset:
+        positions = (None, None)
+
+    tombstones = ProductTombstone.objects.filter(shop_id=shop.pk)
+    if branch:
+        tombstones = tombstones.filter(branch_id=branch.pk)
+    settled = now - timedelta(seconds=CATALOG_SYNC_OVERLAP)
+
+    changed, more_products, products_position = _page(
+        products.only(*PRODUCT_SYNC_FIELDS), "updated_at", positions[0], limit, settled,
+    )
+    if reset:
+        # a fresh catalog has nothing to delete; start the tombstones from now
+        deleted, more_deleted, deleted_position = [], False, (settled, None)
+    else:
+        deleted, more_deleted, deleted_position = _page(
+            tombstones.only("product_id", "deleted_at"), "deleted_at", positions[1], limit, settled,
+        )
+
+    return {
+        "token": encode_token(products_position, deleted_position),
+        "more": more_products or more_deleted,
+        "reset": reset,
+        "products": changed,
+        "deleted": [str(tombstone.product_id) for tombstone in deleted],
+    }
+
+
+def purge_tombstones(ttl=CATALOG_TOMBSTONE_TTL):
+    """
+    Delete tombstones older than ``ttl`` seconds; returns how many.
+    """
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    return ProductTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
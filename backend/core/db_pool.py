@@ -0,0 +1,53 @@
+import os
+import threading
+from collections import Counter
+
+from django.db import connections
+
+_lock = threading.Lock()
+_opened = Counter()
+
+
+def count_connection(alias):
+    with _lock:
+        _opened[alias] += 1
+
+
+def pool_stats():
+    """
+    Connection stats of the current worker process per database alias.
+
+    Every worker process has its own pool, so add up the numbers of all
+    workers when comparing with Postgres max_connections. "opened" counts
+    Django connects in this process; with persistent connections it should
+    stay flat, with a pool every checkout counts.
+    """
+    databases = {}
+    for alias in connections:
+        connection = connections[alias]
+        entry = {
+            "vendor": connection.vendor,
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "health_checks": connection.settings_dict["CONN_HEALTH_CHECKS"],
+            "opened": _opened[alias],
+            "pool": None,
+        }
+        pool = getattr(connection, "pool", None)  # postgres backend with OPTIONS["pool"] only
+        if pool is not None:
+            stats = pool.get_stats()
+            # psycopg_pool leaves out counters that are still zero
+            size, idle = stats.get("pool_size", 0), stats.get("pool_available", 0)
+            entry["pool"] = {
+                "min_size": stats.get("pool_min", 0),
+                "max_size": stats.get("pool_max", 0),
+                "size": size,
+                "idle": idle,
+                "in_use": size - idle,
+                "waiting": stats.get("requests_waiting", 0),
+                "created": stats.get("connections_num", 0),
+                "requests": stats.get("requests_num", 0),
+                "timeouts": stats.get("requests_errors", 0),
+                "lost": stats.get("connections_lost", 0),
+            }
+        databases[alias] = entry
+    return {"pid": os.getpid(), "databases": databases}
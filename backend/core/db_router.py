@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA_DATABASE_ALIAS = getattr(settings, "REPLICA_DATABASE_ALIAS", "replica")
+# how long reads stay on the primary after a write, to cover replication lag
+REPLICA_STICKY_SECONDS = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+_read_replica = ContextVar("read_replica", default=False)
+
+
+def replica_configured():
+    return REPLICA_DATABASE_ALIAS in settings.DATABASES
+
+
+def _pin_key(scope, pk):
+    return f"core:primary-pin:{scope}:{pk}"
+
+
+def pin_to_primary(scope, pk):
+    """
+    Keep reads for a user ("user", id) or a shop ("shop", id) on the primary
+    for REPLICA_STICKY_SECONDS.
+    """
+    if replica_configured():
+        cache.set(_pin_key(scope, pk), True, REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(scope, pk):
+    return bool(pk) and cache.get(_pin_key(scope, pk)) is not None
+
+
+def replica_allowed(request, shop=None):
+    """
+    Whether a read-only request may use the replica. Reports pass their shop:
+    right after the shop's numbers changed a stale replica result would be
+    cached under the new report version.
+    """
+    if not replica_configured() or request.method not in SAFE_METHODS:
+        return False
+    if shop is not None and is_pinned("shop", shop.pk):
+        return False
+    user = getattr(request, "user", None)
+    return not (user is not None and user.is_authenticated and is_pinned("user", user.pk))
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Send ORM reads inside the block to the replica; writes always go to the primary.
+    """
+    token = _read_replica.set(bool(enabled))
+    try:
+        yield
+    finally:
+        _read_replica.reset(token)
+
+
+def read_from_replica(view):
+    """
+    Opt a function view in to replica reads. Put it under @api_view so the
+    user is authenticated when the stickiness check runs.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with replica_reads(replica_allowed(request)):
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+class ReplicaReadsMixin:
+    """
+    Opt an APIView/ViewSet in to replica reads for GET/HEAD/OPTIONS, unless the
+    user wrote something in the last REPLICA_STICKY_SECONDS.
+    """
+
+    def use_replica(self, request):
+        return replica_allowed(request)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # runs after authentication, so the stickiness check sees the user
+        if self.use_replica(request):
+            self._replica_token = _read_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            _read_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica only inside replica_reads(); everything else,
+    including all writes and migrations, uses the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _read_replica.get() and replica_configured():
+            return REPLICA_DATABASE_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        if {obj1._state.db, obj2._state.db} <= {"default", REPLICA_DATABASE_ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == REPLICA_DATABASE_ALIAS:
+            return False
+        return None
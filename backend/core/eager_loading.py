@@ -0,0 +1,105 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField, RelatedField
+
+_plans = {}
+
+
+def _is_single_valued(model, path):
+    # True if every hop of ``path`` is a forward FK/OneToOne (safe for select_related)
+    for name in path.split("__"):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.is_relation:
+            return None
+        if field.many_to_many or field.one_to_many:
+            return False
+        model = field.related_model
+    return True
+
+
+def _add_path(model, path, select, prefetch):
+    kind = _is_single_valued(model, path)
+    if kind is True:
+        select.add(path)
+    elif kind is False:
+        prefetch.append(path)
+
+
+def _nest(path, lookup):
+    if isinstance(lookup, Prefetch):
+        return Prefetch(f"{path}__{lookup.prefetch_through}", queryset=lookup.queryset)
+    return f"{path}__{lookup}"
+
+
+def derive_plan(serializer, model):
+    """
+    Relations ``serializer`` reads when rendering ``model`` instances, as
+    ``(select_related paths, prefetch_related lookups)``.
+
+    Nested serializers become select_related joins (or a ``Prefetch`` with its
+    own plan for ``many=True``), and dotted sources such as
+    ``customer.full_name`` add the relation they walk through. Relations only
+    touched from ``__str__`` cannot be seen here and must be declared on the view.
+    """
+    select, prefetch = set(), []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+        path = field.source.replace(".", "__")
+
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+            if isinstance(child, serializers.ModelSerializer) and _is_single_valued(model, path) is False:
+                child_select, child_prefetch = derive_plan(child, child.Meta.model)
+                queryset = child.Meta.model._default_manager.select_related(*child_select).prefetch_related(*child_prefetch)
+                prefetch.append(Prefetch(path, queryset=queryset))
+        elif isinstance(field, serializers.ModelSerializer):
+            if _is_single_valued(model, path):
+                select.add(path)
+                child_select, child_prefetch = derive_plan(field, field.Meta.model)
+                select.update(f"{path}__{p}" for p in child_select)
+                prefetch.extend(_nest(path, p) for p in child_prefetch)
+        elif isinstance(field, ManyRelatedField):
+            prefetch.append(path)
+        elif isinstance(field, RelatedField):
+            # a plain PrimaryKeyRelatedField renders the local *_id column
+            if not isinstance(field, PrimaryKeyRelatedField):
+                _add_path(model, path, select, prefetch)
+        elif "__" in path:
+            _add_path(model, path.rsplit("__", 1)[0], select, prefetch)
+    return select, prefetch
+
+
+def get_plan(serializer_class):
+    if serializer_class not in _plans:
+        model = serializer_class.Meta.model
+        _plans[serializer_class] = derive_plan(serializer_class(), model)
+    return _plans[serializer_class]
+
+
+def eager_load(queryset, serializer_class, select_related=(), prefetch_related=()):
+    select, prefetch = get_plan(serializer_class)
+    return queryset.select_related(*select, *select_related).prefetch_related(*prefetch, *prefetch_related)
+
+
+class EagerLoadingMixin:
+    """
+    Viewset mixin that loads every relation the serializer renders up front,
+    so responses cost a fixed number of queries instead of one per row.
+
+    ``eager_select_related``/``eager_prefetch_related`` add relations the
+    serializer touches indirectly (e.g. through a model's ``__str__``).
+    """
+
+    eager_select_related = ()
+    eager_prefetch_related = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return eager_load(
+            queryset, self.get_serializer_class(), self.eager_select_related, self.eager_prefetch_related
+        )
@@ -0,0 +1,124 @@
+"""
+Conditional GET (ETag / If-None-Match) for tenant collections.
+
+Every committed write to a shop's products, categories, customers or to the
+shop itself bumps a per-shop version counter in the cache (core.signals for
+model saves and deletes, core.stock for stock updates). List responses carry
+a strong ETag built from the versions they depend on, the tenant and the
+full request path, so a dashboard polling an unchanged collection gets a
+304 before the queryset is built, let alone evaluated or serialized.
+
+Writes that bypass both (QuerySet.update/bulk_create of these models
+elsewhere) must call bump_collection_versions themselves.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db_router import pin_to_primary, replica_allowed
+from .utils import get_request_tenant
+
+ETAG_CACHE_ALIAS = getattr(settings, "ETAG_CACHE_ALIAS", "default")
+
+
+def _version_key(collection, shop_id=None):
+    return f"core:collection-version:{collection}:{shop_id or 'all'}"
+
+
+def collection_versions(collections, shop_id):
+    """
+    The global and the shop's version of each collection, in one cache round trip.
+    """
+    cache = caches[ETAG_CACHE_ALIAS]
+    keys = [key for collection in collections for key in (_version_key(collection), _version_key(collection, shop_id))]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # start from the clock so an evicted counter never reuses an old version
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(keys, shop_ids):
+    cache = caches[ETAG_CACHE_ALIAS]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+    # a poll answered from a lagging replica now would be tagged with the new version
+    for shop_id in shop_ids:
+        pin_to_primary("shop", shop_id)
+
+
+def bump_collection_versions(collection, shop_ids):
+    """
+    Change the ETags of ``collection`` for each shop once the current
+    transaction commits; a shop id of None changes them for every shop.
+    """
+    keys = {_version_key(collection, shop_id) for shop_id in shop_ids}
+    if keys:
+        shop_ids = {shop_id for shop_id in shop_ids if shop_id}
+        transaction.on_commit(lambda: _bump(keys, shop_ids))
+
+
+def collection_etag(request, tenant, collections):
+    shop, branch, role = tenant
+    parts = [
+        *map(str, collection_versions(collections, shop.pk)),
+        str(shop.pk), str(branch.pk) if branch else "", role or "",
+        request.get_full_path(), getattr(request, "accepted_media_type", None) or "",
+    ]
+    return '"%s"' % hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]
+
+
+def not_modified(request, etag):
+    """
+    A 304 response if the request's If-None-Match matches ``etag``, else None.
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == "*"):
+        return tag_response(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+    return None
+
+
+def tag_response(response, etag):
+    response["ETag"] = etag
+    # browsers may keep the response but must revalidate it; shared caches must not keep it
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+class ConditionalListMixin:
+    """
+    ETag / If-None-Match for a tenant ViewSet's list(). ``etag_collections``
+    names every collection the serialized rows depend on.
+    """
+
+    etag_collections = ()
+
+    def use_replica(self, request):
+        # right after a write the shop reads from the primary, so the data matches the new ETag
+        return replica_allowed(request, get_request_tenant(request).shop)
+
+    def list(self, request, *args, **kwargs):
+        tenant = get_request_tenant(request)
+        if not tenant.shop:
+            return super().list(request, *args, **kwargs)
+
+        # read before the rows, so a write committing meanwhile changes the next ETag
+        etag = collection_etag(request, tenant, self.etag_collections)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            tag_response(response, etag)
+        return response
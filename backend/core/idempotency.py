@@ -0,0 +1,90 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+A POS on a flaky connection retries a POST when it never saw the response,
+even though the first attempt may have gone through. When the request
+carries an Idempotency-Key header, the first attempt claims the key in the
+same transaction as its writes and stores its response there; a retry with
+the same key gets that stored response back (marked Idempotent-Replayed)
+without running the serializer or touching stock again.
+
+Keys are per user. Reusing one for a different request body or endpoint is
+refused with 422. A failed attempt (4xx or an exception) releases the key,
+so the client can retry it as is. Stored responses are deleted after
+IDEMPOTENCY_KEY_TTL seconds by `manage.py purge_idempotency_keys`.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_KEY_TTL = getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 3600)
+IDEMPOTENCY_KEY_MAX_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def purge_expired_keys(ttl=IDEMPOTENCY_KEY_TTL):
+    """
+    Delete stored responses older than ``ttl`` seconds; returns how many.
+    """
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    return IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+class IdempotentCreateMixin:
+    """
+    Honour an Idempotency-Key header on a ViewSet's create(). Requests
+    without the header are handled as before.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response(
+                {"error": f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        # a retry costs this one query
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is None:
+            with transaction.atomic():
+                # a concurrent attempt with the same key blocks here until the first one commits,
+                # then finds its row and replays it
+                record, created = IdempotencyKey.objects.get_or_create(
+                    user=request.user, key=key, defaults={"fingerprint": fingerprint},
+                )
+                if created:
+                    response = super().create(request, *args, **kwargs)
+                    if response.status_code >= 400:
+                        transaction.set_rollback(True)
+                    else:
+                        # stored the way the API renders it (Decimal -> string, UUID -> string)
+                        record.status_code = response.status_code
+                        record.response = json.loads(json.dumps(response.data, cls=JSONEncoder))
+                        record.save(update_fields=["status_code", "response"])
+                    return response
+        return self.replay(record, fingerprint)
+
+    def replay(self, record, fingerprint):
+        if record.fingerprint != fingerprint:
+            return Response(
+                {"error": "Idempotency-Key was already used for a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(record.response, status=record.status_code, headers={"Idempotent-Replayed": "true"})
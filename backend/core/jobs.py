@@ -0,0 +1,205 @@
+"""
+Database-backed job queue: no broker, just the core_job table.
+
+Register a function with @job("name"), call enqueue("name", ...) from a
+request (inside its transaction, so the job exists only if the request's
+writes commit), and run `manage.py run_workers` to execute queued jobs.
+
+Workers claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so several
+workers never block on or pick up the same rows. Backends without it
+(SQLite) rely on the conditional status update in claim_jobs instead.
+Failed attempts are retried with exponential backoff until max_attempts.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = getattr(settings, "JOB_MAX_ATTEMPTS", 3)
+# retry n waits JOB_RETRY_BACKOFF * 2 ** (n - 1) seconds, at most JOB_RETRY_BACKOFF_MAX
+JOB_RETRY_BACKOFF = getattr(settings, "JOB_RETRY_BACKOFF", 10)
+JOB_RETRY_BACKOFF_MAX = getattr(settings, "JOB_RETRY_BACKOFF_MAX", 3600)
+# a running job whose worker has been silent this long is assumed dead and requeued
+JOB_TIMEOUT = getattr(settings, "JOB_TIMEOUT", 600)
+
+JobType = namedtuple("JobType", ["func", "max_attempts", "payload_serializer", "roles"])
+
+registry = {}
+
+
+def job(name, max_attempts=JOB_MAX_ATTEMPTS, payload_serializer=None, roles=()):
+    """
+    Register ``func(job, **payload)`` as job type ``name``. Job types with a
+    payload_serializer can also be queued through POST /api/jobs/ by users
+    whose role is in ``roles``.
+    """
+    def register(func):
+        registry[name] = JobType(func, max_attempts, payload_serializer, tuple(roles))
+        return func
+    return register
+
+
+def enqueue(name, payload=None, shop=None, branch=None, user=None, run_at=None):
+    if name not in registry:
+        raise KeyError(f"Unknown job type: {name}")
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        shop=shop,
+        branch=branch,
+        created_by=user if user is not None and user.is_authenticated else None,
+        max_attempts=registry[name].max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def retry_delay(attempts):
+    delay = min(JOB_RETRY_BACKOFF * 2 ** (attempts - 1), JOB_RETRY_BACKOFF_MAX)
+    # jitter, so jobs that failed together don't all retry in the same instant
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_jobs(worker, limit=1):
+    """
+    Mark up to ``limit`` due jobs as running for ``worker`` and return them.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status="queued", run_at__lte=now)
+            .order_by("run_at")[:limit]
+        )
+        claimed = []
+        for job in candidates:
+            # without row locks (SQLite) another worker may have been first
+            if Job.objects.filter(pk=job.pk, status="queued").update(
+                status="running", locked_by=worker, locked_at=now, attempts=job.attempts + 1
+            ):
+                job.status, job.locked_by, job.locked_at, job.attempts = "running", worker, now, job.attempts + 1
+                job.wait_ms = max(0, int((now - job.run_at).total_seconds() * 1000))
+                claimed.append(job)
+    return claimed
+
+
+def run_job(job):
+    """
+    Run a claimed job and record its outcome, timing and, on failure, the
+    next retry. If the job was requeued meanwhile (its lock went stale and
+    another worker took it over) the outcome is dropped, so it cannot
+    overwrite the newer run; returns whether it was recorded.
+    """
+    started = timezone.now()
+    job_type = registry.get(job.name)
+    try:
+        if job_type is None:
+            raise KeyError(f"Unknown job type: {job.name}")
+        # stored the way the API would render it (Decimal -> number, date -> ISO string)
+        result = json.loads(json.dumps(job_type.func(job, **job.payload), cls=JSONEncoder))
+    except Exception:
+        finished = timezone.now()
+        job.error = traceback.format_exc()[-4000:]
+        if job_type is not None and job.attempts < job.max_attempts:
+            job.status, job.run_at = "queued", finished + retry_delay(job.attempts)
+            logger.warning("Job %s (%s) failed, attempt %s of %s", job.pk, job.name, job.attempts, job.max_attempts)
+        else:
+            job.status, job.finished_at = "failed", finished
+            logger.error("Job %s (%s) failed permanently", job.pk, job.name)
+    else:
+        finished = timezone.now()
+        job.status, job.result, job.error, job.finished_at = "succeeded", result, "", finished
+    job.run_ms = int((finished - started).total_seconds() * 1000)
+    # only while this worker still holds the lock it claimed the job with
+    recorded = Job.objects.filter(
+        pk=job.pk, status="running", locked_by=job.locked_by, locked_at=job.locked_at,
+    ).update(
+        status=job.status, run_at=job.run_at, result=job.result, error=job.error, wait_ms=job.wait_ms,
+        run_ms=job.run_ms, locked_by="", locked_at=None, finished_at=job.finished_at,
+    )
+    if not recorded:
+        logger.warning("Job %s (%s) was requeued while %s ran it; outcome dropped", job.pk, job.name, job.locked_by)
+    job.locked_by, job.locked_at = "", None
+    return bool(recorded)
+
+
+def run_due_jobs(worker, limit=10):
+    """
+    Run up to ``limit`` due jobs; returns how many ran.
+
+    Jobs are claimed one at a time, right before each runs: a job claimed
+    with a batch would sit locked behind the others and could go stale
+    (JOB_TIMEOUT) before it even started.
+    """
+    ran = 0
+    while ran < limit:
+        jobs = claim_jobs(worker, 1)
+        if not jobs:
+            break
+        run_job(jobs[0])
+        ran += 1
+    return ran
+
+
+def requeue_stale_jobs(timeout=JOB_TIMEOUT):
+    """
+    Put running jobs whose worker died (locked longer than ``timeout``
+    seconds) back in the queue; the lost run counts as an attempt.
+    """
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = Job.objects.filter(status="running", locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status="failed", locked_by="", locked_at=None, finished_at=timezone.now(), error="Worker timed out",
+    )
+    requeued = stale.update(status="queued", locked_by="", locked_at=None, run_at=timezone.now())
+    return requeued, failed
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))]
+
+
+def job_metrics(jobs):
+    """
+    Per job type: jobs per status, and mean/p50/p95 wait and run times of
+    the finished ones, for the given queryset.
+    """
+    metrics = {}
+    for row in jobs.values("name", "status").annotate(count=Count("id")).order_by():
+        metrics.setdefault(row["name"], {"counts": {}})["counts"][row["status"]] = row["count"]
+
+    timings = {}
+    for name, wait_ms, run_ms in (
+        jobs.filter(status__in=["succeeded", "failed"], run_ms__isnull=False).values_list("name", "wait_ms", "run_ms")
+    ):
+        waits, runs = timings.setdefault(name, ([], []))
+        waits.append(wait_ms or 0)
+        runs.append(run_ms)
+    for name, (waits, runs) in timings.items():
+        for label, values in (("wait_ms", sorted(waits)), ("run_ms", sorted(runs))):
+            metrics[name][label] = {
+                "mean": sum(values) / len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "max": values[-1],
+            }
+    return metrics
@@ -0,0 +1,9 @@
+from django.urls import path, include
+
+from .views import JWTLogoutView
+
+# mounted under auth/ when AUTH_MODE=jwt
+urlpatterns = [
+    path('', include('djoser.urls.jwt')),  # jwt/create/, jwt/refresh/, jwt/verify/
+    path('jwt/logout/', JWTLogoutView.as_view(), name='jwt-logout'),
+]
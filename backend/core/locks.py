@@ -0,0 +1,30 @@
+"""
+Per-shop locks held until the current transaction ends.
+
+On PostgreSQL these are transaction-level advisory locks, one per
+(namespace, shop); writers that must not interleave for a shop take the same
+namespace. SQLite lets a single transaction write at a time, so there they
+are no-ops.
+"""
+import hashlib
+
+from django.db import connection
+
+
+def _lock_key(namespace, shop_id):
+    digest = hashlib.blake2b(f"{namespace}:{shop_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def lock_shops(namespace, shop_ids):
+    """
+    Wait for and take the ``namespace`` lock of each shop. Call it inside
+    transaction.atomic(); the locks are released when that transaction ends.
+    """
+    if connection.vendor != "postgresql":
+        return
+    # a fixed order, so two writers locking several shops never wait on each other
+    keys = sorted({_lock_key(namespace, shop_id) for shop_id in shop_ids if shop_id})
+    with connection.cursor() as cursor:
+        for key in keys:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
@@ -0,0 +1,238 @@
+import asyncio
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+
+from core.report_cache import bump_report_versions
+
+from .load_test import Recorder
+
+
+def add_query_latency(seconds):
+    """
+    Sleep before every query on every connection, to stand in for the network
+    round trip to a real database server.
+    """
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False)
+    install(None, connection)
+
+
+class WorkerMeter:
+    """
+    Requests in flight per worker and CPU time of the worker threads, to tell
+    how much of its wall time a worker spent working rather than waiting.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.cpu = 0.0
+
+    def started(self):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def finished(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def add_cpu(self, seconds):
+        with self.lock:
+            self.cpu += seconds
+
+
+def wsgi_get(app, path, query, token):
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query, "SCRIPT_NAME": "",
+        "SERVER_NAME": "localhost", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost", "HTTP_AUTHORIZATION": f"Token {token}", "REMOTE_ADDR": "127.0.0.1",
+        "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0), "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+    }
+    status = []
+    body = app(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        b"".join(body)
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_get(app, path, query, token):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"authorization", f"Token {token}".encode())],
+        "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+    }
+    body_sent = False
+    status = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # the client never disconnects; Django cancels this once the response is sent
+        await asyncio.Future()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the same report through shopmate.wsgi (sync ReportSummary on N worker threads) and "
+        "shopmate.asgi (async report view on one event loop), in process, and compare throughput, "
+        "latency and how busy each worker was"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per server")
+        parser.add_argument("--workers", type=int, default=4, help="WSGI worker threads")
+        parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight on the ASGI worker")
+        parser.add_argument("--query", default="timeframe=12months&granularity=month")
+        parser.add_argument("--dashboard", action="store_true",
+                            help="Use /api/async/dashboard/ as the async endpoint instead of the async report")
+        parser.add_argument("--db-latency", type=float, default=5,
+                            help="Milliseconds added to every query, for the network round trip (0 = none)")
+        parser.add_argument("--warm", action="store_true", help="Serve reports from the report cache")
+        parser.add_argument("--username", help="Shop owner to request as (default: <prefix>0-owner)")
+        parser.add_argument("--prefix", default="seed")
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+
+    def handle(self, *args, **options):
+        if min(options["requests"], options["workers"], options["concurrency"]) < 1:
+            raise CommandError("--requests, --workers and --concurrency must be at least 1")
+        username = options["username"] or f"{options['prefix']}0-owner"
+        user = get_user_model().objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f"No user '{username}'; run seed_shopmate first or pass --username")
+        token = Token.objects.get_or_create(user=user)[0].key
+        if options["db_latency"]:
+            add_query_latency(options["db_latency"] / 1000)
+
+        # the handlers are built on import, so load them only after settings are configured
+        from shopmate.asgi import application as asgi_app
+        from shopmate.wsgi import application as wsgi_app
+
+        async_path = "/api/async/dashboard/" if options["dashboard"] else "/api/async/reports/summary/"
+        results = [
+            self.run_wsgi(wsgi_app, "/api/reports/summary/", token, options),
+            asyncio.run(self.run_asgi(asgi_app, async_path, token, options)),
+        ]
+
+        self.stdout.write(
+            f"{options['requests']} requests per server on {connection.vendor}, "
+            f"+{options['db_latency']:g} ms per query, {'warm' if options['warm'] else 'cold'} report cache"
+        )
+        header = (
+            f"{'server':<6} {'endpoint':<28} {'workers':>7} {'errors':>6} {'req/s':>8} {'req/s/worker':>12} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'in flight/worker':>16} {'worker cpu':>10}"
+        )
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for r in results:
+            self.stdout.write(
+                f"{r['server']:<6} {r['endpoint']:<28} {r['workers']:>7} {r['errors']:>6} {r['rps']:>8.1f} "
+                f"{r['rps_per_worker']:>12.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+                f"{r['peak_in_flight_per_worker']:>16} {r['worker_cpu_pct']:>9.0f}%"
+            )
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump({"options": {k: options[k] for k in ("requests", "workers", "concurrency", "query",
+                                                               "db_latency", "warm")},
+                           "results": results}, fh, indent=2)
+
+    def result(self, server, endpoint, workers, recorder, meter, elapsed):
+        row = recorder.summary(elapsed)[0]
+        return {
+            "server": server,
+            "endpoint": endpoint,
+            "workers": workers,
+            "requests": row["requests"],
+            "errors": row["errors"],
+            "rps": row["rps"],
+            "rps_per_worker": row["rps"] / workers,
+            "p50_ms": row["p50_ms"],
+            "p95_ms": row["p95_ms"],
+            "p99_ms": row["p99_ms"],
+            "peak_in_flight_per_worker": meter.peak // workers,
+            # share of the workers' wall time spent on the CPU instead of blocked on the database
+            "worker_cpu_pct": 100 * meter.cpu / (workers * elapsed) if elapsed else 0.0,
+        }
+
+    def run_wsgi(self, app, path, token, options):
+        recorder, meter = Recorder(), WorkerMeter()
+        remaining = iter(range(options["requests"]))
+        lock = threading.Lock()
+
+        def worker():
+            cpu = time.thread_time()
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                if not options["warm"]:
+                    bump_report_versions([(None, None)])
+                meter.started()
+                start = time.perf_counter()
+                code = wsgi_get(app, path, options["query"], token)
+                recorder.add(path, time.perf_counter() - start, code < 400)
+                meter.finished()
+            meter.add_cpu(time.thread_time() - cpu)
+            connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["workers"]) as pool:
+            for _ in range(options["workers"]):
+                pool.submit(worker)
+        return self.result("wsgi", path, options["workers"], recorder, meter, time.perf_counter() - started)
+
+    async def run_asgi(self, app, path, token, options):
+        recorder, meter = Recorder(), WorkerMeter()
+        slots = asyncio.Semaphore(options["concurrency"])
+        bump = sync_to_async(bump_report_versions)
+
+        async def one():
+            async with slots:
+                if not options["warm"]:
+                    await bump([(None, None)])
+                meter.started()
+                start = time.perf_counter()
+                code = await asgi_get(app, path, options["query"], token)
+                recorder.add(path, time.perf_counter() - start, code < 400)
+                meter.finished()
+
+        cpu = time.thread_time()
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(options["requests"])))
+        elapsed = time.perf_counter() - started
+        # the event loop thread is the worker; database waits happen in executor threads
+        meter.add_cpu(time.thread_time() - cpu)
+        return self.result("asgi", path, 1, recorder, meter, elapsed)
@@ -0,0 +1,95 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+
+from core.ids import uuid7
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+def index_size(table):
+    """
+    Bytes used by the table's primary key index, or None when the backend
+    cannot tell (SQLite builds without the dbstat table).
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_relation_size(%s)", [f"{table}_pkey"])
+            return cursor.fetchone()[0]
+        if connection.vendor == "sqlite":
+            cursor.execute("SELECT 1 FROM pragma_compile_options WHERE compile_options = 'ENABLE_DBSTAT_VTAB'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                [table],
+            )
+            return cursor.fetchone()[0]
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare insert throughput and primary key index size of random (uuid4) and "
+        "time-ordered (uuid7) ids on scratch tables shaped like core_saleitem"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--keep", action="store_true", help="Leave the scratch tables in place")
+
+    def handle(self, *args, **options):
+        if options["rows"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--rows and --batch-size must be at least 1")
+
+        id_field = models.UUIDField()
+        id_type = id_field.db_type(connection)
+        qn = connection.ops.quote_name
+        results = []
+
+        for name, generate in GENERATORS.items():
+            table = f"bench_pk_{name}"
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {qn(table)}")
+                cursor.execute(
+                    f"CREATE TABLE {qn(table)} (id {id_type} PRIMARY KEY, sale_id {id_type} NOT NULL, "
+                    f"quantity integer NOT NULL, total_price numeric(10, 2) NOT NULL)"
+                )
+            sql = f"INSERT INTO {qn(table)} (id, sale_id, quantity, total_price) VALUES (%s, %s, %s, %s)"
+
+            timings = []
+            remaining = options["rows"]
+            while remaining:
+                size = min(options["batch_size"], remaining)
+                sale_id = id_field.get_db_prep_value(generate(), connection)
+                rows = [
+                    (id_field.get_db_prep_value(generate(), connection), sale_id, 1, "9.99")
+                    for _ in range(size)
+                ]
+                started = time.perf_counter()
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.executemany(sql, rows)
+                timings.append((size, time.perf_counter() - started))
+                remaining -= size
+
+            # the last tenth shows how inserts hold up once the index is large
+            tail = timings[-max(1, len(timings) // 10):]
+            results.append({
+                "ids": name,
+                "rows_per_sec": sum(n for n, _ in timings) / sum(t for _, t in timings),
+                "tail_rows_per_sec": sum(n for n, _ in tail) / sum(t for _, t in tail),
+                "index_bytes": index_size(table),
+            })
+            if not options["keep"]:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE {qn(table)}")
+
+        self.stdout.write(f"{options['rows']} rows on {connection.vendor}, batches of {options['batch_size']}")
+        self.stdout.write(f"{'ids':<6} {'rows/s':>10} {'last 10% rows/s':>16} {'pk index':>12}")
+        for r in results:
+            size = f"{r['index_bytes'] / 1024 / 1024:.1f} MiB" if r["index_bytes"] is not None else "n/a"
+            self.stdout.write(f"{r['ids']:<6} {r['rows_per_sec']:>10.0f} {r['tail_rows_per_sec']:>16.0f} {size:>12}")
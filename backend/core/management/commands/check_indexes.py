@@ -0,0 +1,178 @@
+import uuid
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import ForeignKey, Q
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Branch, Shop
+from core.urls import router
+from core.utils import Tenant
+
+EQUALITY_LOOKUPS = {"exact", "iexact", "in", "isnull"}
+
+# the tenants and query strings every viewset list is checked with
+SCENARIOS = [
+    ("owner", False, {}),
+    ("employee", True, {}),
+    ("owner", False, {"status": "pending"}),
+    ("employee", True, {"status": "pending"}),
+]
+
+
+def model_for_table(table):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+
+
+def column(model, name):
+    return model._meta.get_field(name.lstrip("-")).column
+
+
+def table_indexes(model):
+    """
+    (name, [(column, descending)], condition) for every index the model creates:
+    Meta.indexes, unique constraints, unique_together and single-column
+    field indexes (primary key, unique fields, foreign keys, db_index).
+    """
+    opts = model._meta
+    found = []
+    for index in opts.indexes:
+        if index.fields:
+            found.append((index.name, [(column(model, f), f.startswith("-")) for f in index.fields], index.condition))
+    for constraint in opts.constraints:
+        fields = getattr(constraint, "fields", ())
+        if fields:
+            found.append((constraint.name, [(column(model, f), False) for f in fields], constraint.condition))
+    for fields in opts.unique_together:
+        found.append(("unique_together(%s)" % ", ".join(fields), [(column(model, f), False) for f in fields], None))
+    for field in opts.concrete_fields:
+        if field.primary_key or field.unique or field.db_index or isinstance(field, ForeignKey):
+            found.append((f"{opts.db_table}.{field.column}", [(field.column, False)], None))
+    return found
+
+
+def query_filters(query):
+    """
+    {table: {column: value}} for the equality lookups in the queryset's WHERE clause.
+    """
+    equal = {}
+
+    def walk(node):
+        for child in node.children:
+            if isinstance(child, Lookup):
+                if isinstance(child.lhs, Col) and child.lookup_name in EQUALITY_LOOKUPS:
+                    table = query.alias_map[child.lhs.alias].table_name
+                    equal.setdefault(table, {})[child.lhs.target.column] = child.rhs
+            elif hasattr(child, "children"):
+                walk(child)
+
+    walk(query.where)
+    return equal
+
+
+def condition_holds(model, condition, filters):
+    # a partial index is usable only when the query pins every column of its condition
+    if condition is None:
+        return True
+    for child in condition.children:
+        if isinstance(child, Q) or child[0].count("__"):
+            return False
+        name, value = child
+        col = column(model, name)
+        if col not in filters or str(filters[col]) != str(value):
+            return False
+    return True
+
+
+def find_index(model, filters, ordering):
+    """
+    Name of an index whose leading columns are exactly the equality-filtered
+    columns, followed by the ordering columns, or None.
+    """
+    wanted = set(filters)
+    for name, columns, condition in table_indexes(model):
+        if not condition_holds(model, condition, filters):
+            continue
+        # condition columns are implied by the index predicate and may be left out of it
+        pinned = {column(model, n) for n, _ in (condition.children if condition else [])}
+        head = [c for c, _ in columns[:len(wanted - pinned)]]
+        if set(head) != wanted - pinned:
+            continue
+        tail = columns[len(head):]
+        if ordering:
+            directions = [desc for _, desc in tail[:len(ordering)]]
+            if [c for c, _ in tail[:len(ordering)]] != [c for c, _ in ordering]:
+                continue
+            # a btree serves an ordering in its own direction or fully reversed
+            if directions != [d for _, d in ordering] and directions != [not d for _, d in ordering]:
+                continue
+        return name
+    return None
+
+
+class Command(BaseCommand):
+    help = "Report viewset list filters and orderings that no database index covers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fail", action="store_true", help="Exit with an error when a filter lacks an index (for CI)"
+        )
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        user = get_user_model()(pk=0, username="check_indexes")
+        shop = Shop(pk=uuid.uuid4(), owner=user)
+        branch = Branch(pk=uuid.uuid4(), shop=shop)
+        missing = set()
+        seen = set()
+
+        for prefix, viewset, basename in router.registry:
+            for role, with_branch, params in SCENARIOS:
+                request = Request(factory.get(f"/api/{prefix}/", params))
+                request.user = user
+                request.tenant = Tenant(shop, branch if with_branch else None, role)
+                view = viewset(request=request, args=(), kwargs={}, format_kwarg=None, action="list")
+                queryset = view.filter_queryset(view.get_queryset())
+                query = queryset.query
+
+                model = queryset.model
+                ordering = getattr(view.pagination_class, "ordering", None) or query.order_by or model._meta.ordering
+                if isinstance(ordering, str):
+                    ordering = (ordering,)
+                ordering = [(column(model, o), o.startswith("-")) for o in ordering if o.lstrip("-") != "pk"]
+
+                equal = query_filters(query)
+                for table in sorted(set(equal) | {model._meta.db_table}):
+                    table_model = model_for_table(table)
+                    filters = equal.get(table, {})
+                    table_ordering = ordering if table_model is model else []
+                    if not filters and not table_ordering:
+                        continue
+                    index = find_index(table_model, filters, table_ordering)
+
+                    described = ", ".join(sorted(filters)) or "-"
+                    if table_ordering:
+                        described += " order by " + ", ".join(("-" if d else "") + c for c, d in table_ordering)
+                    line = f"{prefix:<16} {role:<9} {table:<24} {described}"
+                    if line in seen:
+                        continue
+                    seen.add(line)
+                    if index:
+                        self.stdout.write(f"ok       {line}  [{index}]")
+                    else:
+                        missing.add(line)
+                        self.stdout.write(self.style.WARNING(f"MISSING  {line}"))
+
+        if missing:
+            message = f"{len(missing)} viewset filter(s) lack an index"
+            if options["fail"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("Every viewset filter is covered by an index"))
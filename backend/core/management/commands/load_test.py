@@ -0,0 +1,235 @@
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """
+    Thread-safe collection of (endpoint, latency, ok) samples.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, endpoint, seconds, ok):
+        with self.lock:
+            self.samples[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        rows = []
+        for endpoint, latencies in sorted(self.samples.items()):
+            latencies = sorted(latencies)
+            rows.append({
+                "endpoint": endpoint,
+                "requests": len(latencies),
+                "errors": self.errors[endpoint],
+                "rps": len(latencies) / elapsed if elapsed else 0.0,
+                "mean_ms": 1000 * sum(latencies) / len(latencies),
+                "p50_ms": 1000 * percentile(latencies, 50),
+                "p95_ms": 1000 * percentile(latencies, 95),
+                "p99_ms": 1000 * percentile(latencies, 99),
+            })
+        return rows
+
+
+class VirtualCashier:
+    """
+    Replays the POS flows from core/test_selenium.py over the REST API:
+    login, browse products, create + confirm a sale, and now and then add an
+    expense and open the report.
+    """
+
+    def __init__(self, base_url, username, password, recorder, rnd, options):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.recorder = recorder
+        self.rnd = rnd
+        self.options = options
+        self.session = requests.Session()
+        self.iteration = 0
+
+    def call(self, method, endpoint, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            res = self.session.request(method, self.base_url + path, timeout=self.options["timeout"], **kwargs)
+            ok = res.status_code < 400
+        except requests.RequestException:
+            res, ok = None, False
+        self.recorder.add(f"{method} {endpoint}", time.perf_counter() - start, ok)
+        return res if ok else None
+
+    def login(self):
+        res = self.call("POST", "/auth/token/login/", "/auth/token/login/",
+                        json={"username": self.username, "password": self.password})
+        if res is None:
+            return False
+        self.session.headers["Authorization"] = f"Token {res.json()['auth_token']}"
+        return self.call("GET", "/api/my-shop/", "/api/my-shop/") is not None
+
+    def browse_products(self):
+        res = self.call("GET", "/api/products/", "/api/products/?page_size=50")
+        if res is None:
+            return []
+        data = res.json()
+        products = data["results"] if isinstance(data, dict) else data
+        if isinstance(data, dict) and data.get("next") and self.rnd.random() < 0.3:
+            res = self.call("GET", "/api/products/ (next page)", data["next"].replace(self.base_url, ""))
+            if res is not None:
+                products += res.json()["results"]
+        return [p for p in products if p["quantity"] > 10]
+
+    def sell(self, products):
+        if not products:
+            return
+        basket = self.rnd.sample(products, min(len(products), self.rnd.randint(1, 5)))
+        res = self.call("POST", "/api/customers/", "/api/customers/",
+                        json={"full_name": f"Load Customer {self.rnd.randrange(10**6)}", "phone": "0100000000"})
+        if res is None:
+            return
+
+        lines, total = [], 0.0
+        for product in basket:
+            quantity = self.rnd.randint(1, 3)
+            price, cost = float(product["selling_price"]), float(product["cost_price"] or 0)
+            lines.append({
+                "product_id": product["id"], "quantity": quantity, "unit_price": f"{price:.2f}",
+                "unit_cost": f"{cost:.2f}", "total_price": f"{price * quantity:.2f}",
+                "total_cost": f"{cost * quantity:.2f}",
+            })
+            total += price * quantity
+
+        res = self.call("POST", "/api/sales/", "/api/sales/", json={
+            "customer_id": res.json()["id"],
+            "total_amount": f"{total:.2f}",
+            "profit_amount": "0",
+            "invoice_number": f"LT-{self.username}-{time.time_ns()}",
+            "sale_items": lines,
+        })
+        if res is None:
+            return
+        # the server computes the totals from the sale items
+        self.call("POST", "/api/sales/{id}/confirm/", f"/api/sales/{res.json()['id']}/confirm/")
+
+    def add_expense(self):
+        self.call("POST", "/api/expenses/", "/api/expenses/", json={
+            "title": "Load test supplies", "amount": f"{self.rnd.uniform(5, 200):.2f}",
+            "date": date.today().isoformat(),
+        })
+
+    def view_report(self):
+        timeframe = self.rnd.choice(["7days", "30days", "3months", "12months"])
+        self.call("GET", "/api/reports/summary/", f"/api/reports/summary/?timeframe={timeframe}")
+
+    def run(self, deadline):
+        if not self.login():
+            return
+        while time.monotonic() < deadline:
+            if self.options["iterations"] and self.iteration >= self.options["iterations"]:
+                break
+            self.iteration += 1
+            self.sell(self.browse_products())
+            if self.iteration % self.options["expense_every"] == 0:
+                self.add_expense()
+            if self.iteration % self.options["report_every"] == 0:
+                self.view_report()
+            if self.options["think_time"]:
+                time.sleep(self.rnd.uniform(0, 2 * self.options["think_time"]))
+
+
+class Command(BaseCommand):
+    help = (
+        "Headless HTTP load test: many concurrent virtual cashiers replay the POS flows "
+        "against a running server and report throughput and latency percentiles per endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--users", type=int, default=10, help="Concurrent virtual cashiers")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds to run")
+        parser.add_argument("--iterations", type=int, default=0, help="Stop each cashier after N sales (0 = no limit)")
+        parser.add_argument("--ramp-up", type=float, default=5, help="Seconds over which cashiers start")
+        parser.add_argument("--think-time", type=float, default=0, help="Mean pause between sales, in seconds")
+        parser.add_argument("--expense-every", type=int, default=10, help="Add an expense every N sales")
+        parser.add_argument("--report-every", type=int, default=5, help="Open the report every N sales")
+        parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+        parser.add_argument("--seed", type=int, default=42)
+        # accounts created by seed_shopmate: <prefix><shop>-b<branch>-e<employee>
+        parser.add_argument("--prefix", default="seed")
+        parser.add_argument("--shops", type=int, default=1)
+        parser.add_argument("--branches", type=int, default=2)
+        parser.add_argument("--employees", type=int, default=3)
+        parser.add_argument("--password", default="shopmate-seed")
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1:
+            raise CommandError("--users must be at least 1")
+        if options["expense_every"] < 1 or options["report_every"] < 1:
+            raise CommandError("--expense-every and --report-every must be at least 1")
+
+        accounts = [
+            f"{options['prefix']}{s}-b{b}-e{e}"
+            for s in range(options["shops"])
+            for b in range(options["branches"])
+            for e in range(options["employees"])
+        ]
+        if not accounts:
+            raise CommandError("No accounts to log in with; check --shops/--branches/--employees")
+
+        recorder = Recorder()
+        cashiers = [
+            VirtualCashier(
+                options["base_url"], accounts[i % len(accounts)], options["password"], recorder,
+                random.Random(options["seed"] + i), options,
+            )
+            for i in range(options["users"])
+        ]
+
+        def start(index):
+            time.sleep(options["ramp_up"] * index / len(cashiers))
+            cashiers[index].run(deadline)
+
+        self.stdout.write(f"Running {len(cashiers)} virtual cashiers against {options['base_url']} ...")
+        started = time.monotonic()
+        deadline = started + options["duration"]
+        with ThreadPoolExecutor(max_workers=len(cashiers)) as executor:
+            list(executor.map(start, range(len(cashiers))))
+        elapsed = time.monotonic() - started
+
+        rows = recorder.summary(elapsed)
+        self.print_table(rows, elapsed)
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump({"elapsed_seconds": elapsed, "users": len(cashiers), "endpoints": rows}, fh, indent=2)
+
+    def print_table(self, rows, elapsed):
+        header = f"{'endpoint':<40} {'reqs':>7} {'errs':>5} {'req/s':>8} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for r in rows:
+            self.stdout.write(
+                f"{r['endpoint']:<40} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+                f"{r['mean_ms']:>7.1f}ms {r['p50_ms']:>6.1f}ms {r['p95_ms']:>6.1f}ms {r['p99_ms']:>6.1f}ms"
+            )
+        total = sum(r["requests"] for r in rows)
+        errors = sum(r["errors"] for r in rows)
+        self.stdout.write(f"\n{total} requests, {errors} errors in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
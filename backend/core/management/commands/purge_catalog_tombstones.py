@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalog import CATALOG_TOMBSTONE_TTL, purge_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete deleted-product tombstones older than CATALOG_TOMBSTONE_TTL; run it from cron"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ttl", type=int, default=CATALOG_TOMBSTONE_TTL,
+                            help="Delete tombstones older than this many seconds")
+
+    def handle(self, *args, **options):
+        if options["ttl"] < 0:
+            raise CommandError("--ttl must not be negative")
+        self.stdout.write(f"Deleted {purge_tombstones(options['ttl'])} tombstone(s)")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.idempotency import IDEMPOTENCY_KEY_TTL, purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL; run it from cron"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ttl", type=int, default=IDEMPOTENCY_KEY_TTL,
+                            help="Delete keys older than this many seconds")
+
+    def handle(self, *args, **options):
+        if options["ttl"] < 0:
+            raise CommandError("--ttl must not be negative")
+        self.stdout.write(f"Deleted {purge_expired_keys(options['ttl'])} idempotency key(s)")
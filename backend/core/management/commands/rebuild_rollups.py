@@ -0,0 +1,59 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.timezone import localdate
+
+
+def rebuild_chunk(start, end, shop_ids):
+    # runs in a worker process; make sure Django is configured there as well
+    import django
+    django.setup()
+
+    from core.rollups import rebuild_rollups
+    return start, end, rebuild_rollups(start, end, shop_ids)
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailyShopStats/DailyProductStats for a date range, split into chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=date.fromisoformat, help="First day (YYYY-MM-DD), default 365 days ago")
+        parser.add_argument("--end", type=date.fromisoformat, help="Last day (YYYY-MM-DD), default today")
+        parser.add_argument("--chunk-days", type=int, default=31)
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Worker processes; more than 1 needs a database with concurrent writers (PostgreSQL)",
+        )
+        parser.add_argument("--shop", action="append", dest="shops", help="Only rebuild this shop id (repeatable)")
+
+    def handle(self, *args, **options):
+        end = options["end"] or localdate()
+        start = options["start"] or end - timedelta(days=365)
+        if start > end:
+            raise CommandError("--start must not be after --end")
+        if options["chunk_days"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-days and --workers must be at least 1")
+
+        chunks = []
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=options["chunk_days"] - 1), end)
+            chunks.append((chunk_start, chunk_end, options["shops"]))
+            chunk_start = chunk_end + timedelta(days=1)
+
+        if options["workers"] == 1:
+            for chunk in chunks:
+                self.report(*rebuild_chunk(*chunk))
+        else:
+            # worker processes must open their own connections, not share ours
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+                for result in executor.map(rebuild_chunk, *zip(*chunks)):
+                    self.report(*result)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {start} .. {end} in {len(chunks)} chunk(s)"))
+
+    def report(self, start, end, counts):
+        self.stdout.write(f"{start} .. {end}: {counts[0]} shop rows, {counts[1]} product rows")
@@ -0,0 +1,93 @@
+import logging
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connections
+
+from core.jobs import JOB_TIMEOUT, requeue_stale_jobs, run_due_jobs, worker_name
+
+logger = logging.getLogger("core.jobs")
+
+# how often a worker looks for jobs abandoned by dead workers
+STALE_CHECK_INTERVAL = 60
+
+
+def work(stop, poll_interval, batch_size, stale_timeout):
+    # runs in a worker process; make sure Django is configured there as well
+    import django
+    django.setup()
+
+    # the parent handles Ctrl-C and tells us through `stop`, so a job is never cut off halfway
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+
+    name = worker_name()
+    next_stale_check = 0.0
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            if time.monotonic() >= next_stale_check:
+                requeue_stale_jobs(stale_timeout)
+                next_stale_check = time.monotonic() + STALE_CHECK_INTERVAL
+            ran = run_due_jobs(name, batch_size)
+        except DatabaseError:
+            # lost connection, lock timeout, failover: keep the worker alive and try again
+            logger.exception("Job worker %s could not reach the queue", name)
+            connections.close_all()
+            ran = 0
+        if not ran:
+            stop.wait(poll_interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (core.jobs) in worker processes until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=2,
+            help="Worker processes; more than 1 needs a database with concurrent writers (PostgreSQL)",
+        )
+        parser.add_argument("--batch-size", type=int, default=10, help="Jobs run per poll, claimed one at a time")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--stale-timeout", type=int, default=JOB_TIMEOUT,
+                            help="Requeue running jobs locked for longer than this many seconds")
+        parser.add_argument("--once", action="store_true",
+                            help="Run the due jobs in this process, then exit (e.g. from cron or tests)")
+
+    def handle(self, *args, **options):
+        if options["processes"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--processes and --batch-size must be at least 1")
+
+        if options["once"]:
+            requeue_stale_jobs(options["stale_timeout"])
+            name, total = worker_name(), 0
+            while ran := run_due_jobs(name, options["batch_size"]):
+                total += ran
+            self.stdout.write(f"Ran {total} job(s)")
+            return
+
+        # worker processes must open their own connections, not share ours
+        connections.close_all()
+        stop = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(
+                target=work, name=f"job-worker-{n}",
+                args=(stop, options["poll_interval"], options["batch_size"], options["stale_timeout"]),
+            )
+            for n in range(options["processes"])
+        ]
+        for process in workers:
+            process.start()
+        self.stdout.write(f"Started {len(workers)} job worker(s); Ctrl-C stops them after their current job")
+
+        def shutdown(*args):
+            stop.set()
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        for process in workers:
+            process.join()
+        self.stdout.write(self.style.SUCCESS("Job workers stopped"))
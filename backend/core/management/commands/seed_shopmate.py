@@ -0,0 +1,238 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+# weights for the hour a sale happens (0-23): quiet mornings, lunch and evening peaks
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 1, 2, 4, 6, 7, 8, 10, 9, 7, 6, 6, 8, 10, 9, 6, 3, 1, 0]
+# Monday..Sunday
+WEEKDAY_WEIGHTS = [0.9, 0.85, 0.9, 0.95, 1.1, 1.3, 1.2]
+STATUS_WEIGHTS = {"completed": 90, "pending": 7, "cancelled": 3}
+EXPENSE_TITLES = ["Rent", "Electricity", "Salary", "Internet", "Supplies", "Transport", "Maintenance"]
+
+
+@contextmanager
+def historic_timestamps(*models):
+    # let bulk_create keep the generated created_at instead of stamping "now"
+    fields = [model._meta.get_field("created_at") for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def money(value):
+    return Decimal(value).quantize(Decimal("0.01"))
+
+
+def seed_shop(index, options):
+    """
+    Generate one shop and its history. Runs in a worker process when --workers > 1;
+    every shop has its own Random(seed + index), so the output does not depend on
+    how shops are spread over workers.
+    """
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    from core.models import (
+        Branch, Category, Customer, Expense, Product, Profile, Sale, SaleItem, Shop, ShopMembership,
+    )
+    from core.rollups import rebuild_rollups
+
+    User = get_user_model()
+    rnd = random.Random(options["seed"] + index)
+    prefix = f"{options['prefix']}{index}"
+    batch_size = options["batch_size"]
+    password = make_password(options["password"])
+    end = timezone.localdate()
+    start = end - timedelta(days=options["days"] - 1)
+
+    owner = User.objects.create(username=f"{prefix}-owner", email=f"{prefix}-owner@example.com", password=password)
+    Profile.objects.create(user=owner, full_name=f"Owner {prefix}")
+    shop = Shop.objects.create(name=f"Seed Shop {prefix}", owner=owner, address=f"{index} Market Road")
+    branches = Branch.objects.bulk_create([
+        Branch(shop=shop, branch_name=f"Branch {b + 1}", location=f"Area {b + 1}")
+        for b in range(options["branches"])
+    ])
+
+    employees = User.objects.bulk_create([
+        User(username=f"{prefix}-b{b}-e{e}", email=f"{prefix}-b{b}-e{e}@example.com", password=password)
+        for b in range(len(branches))
+        for e in range(options["employees"])
+    ])
+    Profile.objects.bulk_create([Profile(user=u, full_name=u.username.title()) for u in employees])
+    ShopMembership.objects.bulk_create(
+        [ShopMembership(user=owner, shop=shop, role="owner", status="approved")]
+        + [
+            ShopMembership(
+                user=u, shop=shop, branch=branches[i // options["employees"]], role="employee", status="approved"
+            )
+            for i, u in enumerate(employees)
+        ]
+    )
+    cashiers = {branch.pk: [u for i, u in enumerate(employees) if i // options["employees"] == b]
+                for b, branch in enumerate(branches)}
+
+    # categories and products belong to a branch, as when created by its employees
+    categories = Category.objects.bulk_create([
+        Category(shop=shop, branch=rnd.choice(branches), name=f"Category {c + 1}")
+        for c in range(options["categories"])
+    ])
+    products = []
+    for p in range(options["products"]):
+        cost = money(rnd.lognormvariate(3.5, 0.8))
+        category = rnd.choice(categories)
+        products.append(Product(
+            shop=shop, branch=category.branch, category=category, name=f"Product {p + 1}",
+            cost_price=cost, selling_price=money(cost * Decimal(rnd.uniform(1.1, 1.6))),
+            quantity=rnd.randint(50, 5000),
+        ))
+    products = Product.objects.bulk_create(products, batch_size=batch_size)
+    # Zipf-like popularity: a few best sellers, a long tail
+    popularity = [1 / (rank + 1) for rank in range(len(products))]
+    rnd.shuffle(popularity)
+    products_by_branch = {branch.pk: [] for branch in branches}
+    weights_by_branch = {branch.pk: [] for branch in branches}
+    for product, weight in zip(products, popularity):
+        products_by_branch[product.branch_id].append(product)
+        weights_by_branch[product.branch_id].append(weight)
+    weights_by_branch = {pk: list(accumulate(w)) for pk, w in weights_by_branch.items()}
+
+    customers = Customer.objects.bulk_create([
+        Customer(
+            shop=shop, branch=rnd.choice(branches), full_name=f"Customer {c + 1}",
+            phone=f"01{rnd.randrange(10**8, 10**9)}",
+        )
+        for c in range(options["customers"])
+    ], batch_size=batch_size)
+    customers_by_branch = {branch.pk: [c for c in customers if c.branch_id == branch.pk] for branch in branches}
+
+    days = [start + timedelta(days=d) for d in range(options["days"])]
+    # busier on weekends and slowly growing over the period
+    day_weights = list(accumulate(
+        WEEKDAY_WEIGHTS[day.weekday()] * (0.7 + 0.6 * d / len(days)) for d, day in enumerate(days)
+    ))
+    hour_weights = list(accumulate(HOUR_WEIGHTS))
+    tz = timezone.get_current_timezone()
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    selling = [b for b in branches if products_by_branch[b.pk]]
+
+    sales_written = items_written = 0
+    with historic_timestamps(Sale, Expense):
+        remaining = options["sales"] if selling else 0
+        while remaining:
+            sales, items = [], []
+            for _ in range(min(batch_size, remaining)):
+                branch = rnd.choice(selling)
+                day = rnd.choices(days, cum_weights=day_weights)[0]
+                hour = rnd.choices(range(24), cum_weights=hour_weights)[0]
+                created = datetime.combine(day, time(hour, rnd.randrange(60), rnd.randrange(60)), tz)
+                sale = Sale(
+                    shop=shop, branch=branch, employee=rnd.choice(cashiers[branch.pk]) if cashiers[branch.pk] else owner,
+                    customer=rnd.choice(customers_by_branch[branch.pk] or customers) if customers else None,
+                    invoice_number=f"{prefix}-INV-{sales_written + len(sales) + 1}",
+                    status=rnd.choices(statuses, status_weights)[0], created_at=created,
+                    total_amount=0, profit_amount=0,
+                )
+                basket = min(int(rnd.expovariate(0.45)) + 1, 12)
+                lines = rnd.choices(products_by_branch[branch.pk], cum_weights=weights_by_branch[branch.pk], k=basket)
+                for product in lines:
+                    quantity = rnd.choices([1, 2, 3, 4, 6], [60, 22, 9, 5, 4])[0]
+                    item = SaleItem(
+                        sale=sale, product=product, quantity=quantity, unit_price=product.selling_price,
+                        unit_cost=product.cost_price, total_price=product.selling_price * quantity,
+                        total_cost=product.cost_price * quantity,
+                    )
+                    sale.total_amount += item.total_price
+                    sale.profit_amount += item.total_price - item.total_cost
+                    items.append(item)
+                sales.append(sale)
+
+            Sale.objects.bulk_create(sales)
+            SaleItem.objects.bulk_create(items, batch_size=batch_size)
+            sales_written += len(sales)
+            items_written += len(items)
+            remaining -= len(sales)
+
+        expenses = []
+        for e in range(options["expenses"]):
+            day = rnd.choice(days)
+            expenses.append(Expense(
+                shop=shop, branch=rnd.choice(branches) if branches else None, title=rnd.choice(EXPENSE_TITLES),
+                amount=money(rnd.lognormvariate(6, 1)), date=day,
+                created_at=datetime.combine(day, time(rnd.randint(8, 20)), tz),
+            ))
+        Expense.objects.bulk_create(expenses, batch_size=batch_size)
+
+    rebuild_rollups(start, end, [shop.pk])
+    return index, sales_written, items_written
+
+
+SEED_OPTIONS = (
+    "branches", "employees", "categories", "products", "customers", "sales", "expenses",
+    "days", "seed", "batch_size", "prefix", "password",
+)
+
+
+class Command(BaseCommand):
+    help = "Generate deterministic synthetic shops, catalog and sales history for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shops", type=int, default=1)
+        parser.add_argument("--branches", type=int, default=2, help="Branches per shop")
+        parser.add_argument("--employees", type=int, default=3, help="Employees per branch")
+        parser.add_argument("--categories", type=int, default=12, help="Categories per shop")
+        parser.add_argument("--products", type=int, default=300, help="Products per shop")
+        parser.add_argument("--customers", type=int, default=1000, help="Customers per shop")
+        parser.add_argument("--sales", type=int, default=20000, help="Sales per shop")
+        parser.add_argument("--expenses", type=int, default=500, help="Expenses per shop")
+        parser.add_argument("--days", type=int, default=365, help="Length of the generated history")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows per bulk_create batch")
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Seed shops in parallel processes; more than 1 needs a database with concurrent writers (PostgreSQL)",
+        )
+        parser.add_argument("--prefix", default="seed", help="Prefix for generated usernames and invoice numbers")
+        parser.add_argument("--password", default="shopmate-seed", help="Password for every generated user")
+
+    def handle(self, *args, **options):
+        from django.contrib.auth import get_user_model
+
+        for name in ("shops", "branches", "categories", "days", "batch_size", "workers"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1")
+        if get_user_model().objects.filter(username__startswith=f"{options['prefix']}0-").exists():
+            raise CommandError(f"Data with prefix '{options['prefix']}' already exists; pass another --prefix")
+
+        shops = range(options["shops"])
+        config = {name: options[name] for name in SEED_OPTIONS}
+        if options["workers"] == 1:
+            for index in shops:
+                self.report(*seed_shop(index, config))
+        else:
+            # worker processes must open their own connections, not share ours
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+                for result in executor.map(seed_shop, shops, [config] * len(shops)):
+                    self.report(*result)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['shops']} shop(s); users log in as {options['prefix']}<n>-owner / "
+            f"{options['prefix']}<n>-b<branch>-e<employee> with password '{options['password']}'"
+        ))
+
+    def report(self, index, sales, items):
+        self.stdout.write(f"shop {index}: {sales} sales, {items} sale items")
@@ -0,0 +1,66 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.functional import SimpleLazyObject
+from rest_framework.permissions import SAFE_METHODS
+
+from .db_router import pin_to_primary
+from .utils import get_user_tenant
+
+
+class TenantMiddleware:
+    """
+    Attaches ``request.tenant`` (shop, branch, role) to every request.
+
+    The lookup is lazy because DRF authenticates inside the view: by the time a
+    view touches ``request.tenant`` the token user has been copied onto the
+    underlying HttpRequest, and the result is reused for the rest of the request.
+    Async views must evaluate it inside sync_to_async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.tenant = SimpleLazyObject(lambda: get_user_tenant(request.user))
+        return self.get_response(request)
+
+
+class PrimaryStickinessMiddleware:
+    """
+    After a successful write, keeps the user's reads on the primary for
+    REPLICA_STICKY_SECONDS so they see their own changes despite replica lag.
+    Does nothing unless a replica database is configured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.pin_writer(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            await sync_to_async(self.pin_writer)(request, response)
+        return response
+
+    def pin_writer(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            # DRF copies the authenticated user onto the HttpRequest; pinning is a
+            # no-op without a replica
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary("user", user.pk)
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:16
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_sale_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_product_stats', to='core.shop')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('branch__isnull', False)), fields=('shop', 'branch', 'product', 'day'), name='uniq_daily_product_stats_branch'), models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('shop', 'product', 'day'), name='uniq_daily_product_stats_shop')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyShopStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expense', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.shop')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('branch__isnull', False)), fields=('shop', 'branch', 'day'), name='uniq_daily_shop_stats_branch'), models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('shop', 'day'), name='uniq_daily_shop_stats_shop')],
+            },
+        ),
+    ]
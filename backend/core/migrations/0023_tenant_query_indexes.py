@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_list_cursor_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['shop', 'branch', 'name'], name='category_branch_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['shop', 'branch', '-created_at', '-id'], name='customer_branch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyshopstats',
+            index=models.Index(fields=['shop', 'day'], name='daily_shop_stats_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['shop', 'branch', '-created_at', '-id'], name='expense_branch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['shop', 'branch', '-created_at', '-id'], name='product_branch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['shop', 'branch', '-created_at', '-id'], name='sale_branch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['shop', 'status', '-created_at', '-id'], name='sale_shop_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['shop', 'branch', '-created_at', '-id'], name='sale_branch_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopmembership',
+            index=models.Index(fields=['user', 'status'], name='membership_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopmembership',
+            index=models.Index(fields=['shop', 'status'], name='membership_shop_status_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:30
+
+import core.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_tenant_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='id',
+            field=models.UUIDField(default=core.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='saleitem',
+            name='id',
+            field=models.UUIDField(default=core.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
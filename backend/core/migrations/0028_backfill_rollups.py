@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Max, Min
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Fill the rollup tables (0021) from the sales and expenses recorded before
+    they existed; reports read only from them.
+    """
+    from core.rollups import replace_rollups
+
+    Sale, Expense = apps.get_model("core", "Sale"), apps.get_model("core", "Expense")
+    sales = Sale.objects.aggregate(first=Min("created_at"), last=Max("created_at"))
+    expenses = Expense.objects.aggregate(first=Min("date"), last=Max("date"))
+    days = [
+        *(moment.date() for moment in sales.values() if moment),
+        *(day for day in expenses.values() if day),
+    ]
+    if days:
+        # a day either side: sales are bucketed by their local date, not the UTC one
+        replace_rollups(apps, min(days) - timedelta(days=1), max(days) + timedelta(days=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_catalog_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
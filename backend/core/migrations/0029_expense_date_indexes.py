@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_backfill_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_shop_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_branch_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['shop', '-date', '-created_at', '-id'], name='expense_shop_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['shop', 'branch', '-date', '-created_at', '-id'], name='expense_branch_date_idx'),
+        ),
+    ]
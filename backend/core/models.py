@@ -3,6 +3,8 @@ from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from .ids import uuid7
+
 # Create your models here.
 class Profile(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -69,6 +71,11 @@ class ShopMembership(models.Model):
 
     class Meta:
         unique_together = ('user', 'shop', 'branch')  # user can be in multiple branches of same shop
+        indexes = [
+            # tenant resolution: the user's approved membership
+            models.Index(fields=["user", "status"], name="membership_user_status_idx"),
+            models.Index(fields=["shop", "status"], name="membership_shop_status_idx"),
+        ]
 
     def __str__(self):
         branch_name = self.branch.branch_name if self.branch else "No Branch"
@@ -86,6 +93,12 @@ class Customer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["shop", "-created_at", "-id"], name="customer_shop_created_idx"),
+            models.Index(fields=["shop", "branch", "-created_at", "-id"], name="customer_branch_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.full_name} ({self.phone})"
 
@@ -100,6 +113,9 @@ class Category(models.Model):
     class Meta:
         unique_together = ('shop', 'name')
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["shop", "branch", "name"], name="category_branch_name_idx"),
+        ]
 
     def __str__(self):
         if self.branch:
@@ -122,17 +138,48 @@ class Product(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["shop", "-created_at", "-id"], name="product_shop_created_idx"),
+            models.Index(fields=["shop", "branch", "-created_at", "-id"], name="product_branch_created_idx"),
+            # catalog delta sync (core/catalog.py) walks (updated_at, id) per shop/branch
+            models.Index(fields=["shop", "updated_at", "id"], name="product_shop_updated_idx"),
+            models.Index(fields=["shop", "branch", "updated_at", "id"], name="product_branch_updated_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.shop.name})"
 
+
+class ProductTombstone(models.Model):
+    """
+    A deleted product, kept so catalog sync clients (core/catalog.py) learn
+    to drop it. Plain ids rather than foreign keys: the shop or branch may be
+    going away together with the product.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    product_id = models.UUIDField()
+    shop_id = models.UUIDField()
+    branch_id = models.UUIDField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["shop_id", "deleted_at", "id"], name="tombstone_shop_deleted_idx"),
+            models.Index(fields=["shop_id", "branch_id", "deleted_at", "id"], name="tombstone_branch_deleted_idx"),
+            # the TTL sweeper deletes by age
+            models.Index(fields=["deleted_at"], name="tombstone_deleted_idx"),
+        ]
+
+    def __str__(self):
+        return f"Deleted product {self.product_id}"
+
 class Sale(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
         ("completed", "Completed"),
         ("cancelled", "Cancelled"),
     ]
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     shop = models.ForeignKey(Shop, on_delete=models.CASCADE)
     employee = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True) 
@@ -143,11 +190,23 @@ class Sale(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["shop", "-created_at", "-id"], name="sale_shop_created_idx"),
+            models.Index(fields=["shop", "branch", "-created_at", "-id"], name="sale_branch_created_idx"),
+            models.Index(fields=["shop", "status", "-created_at", "-id"], name="sale_shop_status_idx"),
+            # the pending-invoices screen of a branch; pending sales are a small slice of the table
+            models.Index(
+                fields=["shop", "branch", "-created_at", "-id"], condition=models.Q(status="pending"),
+                name="sale_branch_pending_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Sale {self.invoice_number} - {self.shop.name} ({self.status})"
 
 class SaleItem(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name="sale_items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
@@ -180,5 +239,139 @@ class Expense(models.Model):
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["shop", "-date", "-created_at", "-id"], name="expense_shop_date_idx"),
+            models.Index(fields=["shop", "branch", "-date", "-created_at", "-id"], name="expense_branch_date_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.amount} - {self.shop.name}"
+
+
+class DailyShopStats(models.Model):
+    # Per shop/branch/day rollup of non-cancelled sales and expenses, kept in step by core.rollups
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="daily_stats")
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, null=True, blank=True)
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sales_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shop", "branch", "day"], condition=models.Q(branch__isnull=False),
+                name="uniq_daily_shop_stats_branch",
+            ),
+            models.UniqueConstraint(
+                fields=["shop", "day"], condition=models.Q(branch__isnull=True),
+                name="uniq_daily_shop_stats_shop",
+            ),
+        ]
+        indexes = [
+            # shop-wide reports sum the shop row and every branch row of each day
+            models.Index(fields=["shop", "day"], name="daily_shop_stats_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.shop.name} {self.day}"
+
+
+class DailyProductStats(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="daily_product_stats")
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, null=True, blank=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shop", "branch", "product", "day"], condition=models.Q(branch__isnull=False),
+                name="uniq_daily_product_stats_branch",
+            ),
+            models.UniqueConstraint(
+                fields=["shop", "product", "day"], condition=models.Q(branch__isnull=True),
+                name="uniq_daily_product_stats_shop",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} {self.day}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, claimed by `manage.py run_workers` (see core/jobs.py).
+    """
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("succeeded", "Succeeded"),
+        ("failed", "Failed"),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, null=True, blank=True, related_name="jobs")
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)  # not claimed before this (retry backoff)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # timing of the last attempt: ready -> claimed, claimed -> finished
+    wait_ms = models.PositiveIntegerField(null=True, blank=True)
+    run_ms = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # workers poll for due queued jobs; finished jobs are most of the table
+            models.Index(fields=["run_at"], condition=models.Q(status="queued"), name="job_queued_run_at_idx"),
+            models.Index(fields=["status", "locked_at"], name="job_status_locked_idx"),
+            models.Index(fields=["shop", "-created_at", "-id"], name="job_shop_created_idx"),
+            # employees only list the jobs they queued
+            models.Index(fields=["created_by", "shop", "-created_at", "-id"], name="job_creator_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response to a POST sent with an Idempotency-Key header, replayed when the
+    client retries with the same key (see core/idempotency.py).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    # set when the request completes, in the transaction that claimed the key
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="uniq_idempotency_key_user"),
+        ]
+        indexes = [
+            # the TTL sweeper deletes by age
+            models.Index(fields=["created_at"], name="idempotency_key_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
@@ -0,0 +1,25 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Each page is a ``WHERE created_at < cursor`` range scan on the
+    (shop, created_at, id) indexes, so page 500 costs the same as page 1.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = getattr(settings, "API_PAGE_SIZE", 50)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 500)
+
+
+class ExpenseCursorPagination(CreatedAtCursorPagination):
+    """
+    Expenses by the day they were paid, newest first; a backdated expense
+    sits under its own date. Scans the (shop, date, created_at, id) indexes.
+    """
+
+    ordering = ("-date", "-created_at", "-id")
@@ -0,0 +1,101 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.timezone import localdate
+
+from .db_router import pin_to_primary
+
+REPORT_CACHE_ALIAS = getattr(settings, "REPORT_CACHE_ALIAS", "default")
+REPORT_CACHE_TIMEOUT = getattr(settings, "REPORT_CACHE_TIMEOUT", 300)
+# how long one worker may hold the recompute lock before others give up waiting
+REPORT_CACHE_LOCK_TIMEOUT = getattr(settings, "REPORT_CACHE_LOCK_TIMEOUT", 30)
+REPORT_CACHE_POLL_INTERVAL = 0.05
+
+
+def report_cache():
+    return caches[REPORT_CACHE_ALIAS]
+
+
+def _version_key(shop_id, branch_id=None):
+    return f"core:report-version:{shop_id or 'all'}:{branch_id or 'all'}"
+
+
+def get_version(shop_id, branch_id=None):
+    cache = report_cache()
+    key = _version_key(shop_id, branch_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so an evicted counter never reuses an old version
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(keys, shop_ids):
+    cache = report_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+    # a report computed from a lagging replica now would be cached under the new version
+    for shop_id in shop_ids:
+        pin_to_primary("shop", shop_id)
+
+
+def bump_report_versions(shop_branches):
+    """
+    Invalidate cached reports for each (shop_id, branch_id) once the current transaction commits.
+
+    A write bumps its branch's version and the shop-wide version used by owner
+    reports; ``(None, None)`` invalidates every shop.
+    """
+    keys, shop_ids = set(), set()
+    for shop_id, branch_id in shop_branches:
+        keys.add(_version_key(shop_id))
+        if shop_id:
+            shop_ids.add(shop_id)
+        if branch_id:
+            keys.add(_version_key(shop_id, branch_id))
+    if keys:
+        transaction.on_commit(lambda: _bump(keys, shop_ids))
+
+
+def report_cache_key(shop, branch, timeframe, granularity):
+    versions = f"{get_version(None)}.{get_version(shop.pk, branch.pk if branch else None)}"
+    scope = f"{shop.pk}:{branch.pk if branch else 'all'}"
+    return f"core:report:{scope}:{timeframe}:{granularity}:{localdate().isoformat()}:{versions}"
+
+
+def get_or_compute(key, compute, timeout=REPORT_CACHE_TIMEOUT):
+    """
+    Return the cached value for ``key`` or compute and store it.
+
+    Only the worker that wins the lock recomputes a missing entry; the others
+    poll for its result and only compute themselves if the lock expires first.
+    """
+    cache = report_cache()
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, REPORT_CACHE_LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + REPORT_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(REPORT_CACHE_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock_key) is None:
+            break
+    return compute()
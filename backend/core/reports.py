@@ -0,0 +1,161 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import DateField, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils.timezone import localdate
+
+from .models import DailyShopStats, Product, Sale
+from .report_cache import get_or_compute, report_cache_key
+
+# products at or below this quantity count as low stock on the dashboard
+LOW_STOCK_THRESHOLD = getattr(settings, "LOW_STOCK_THRESHOLD", 5)
+
+TIMEFRAME_DAYS = {
+    "7days": 7,
+    "30days": 30,
+    "3months": 90,
+    "12months": 365,
+}
+DEFAULT_TIMEFRAME = "30days"
+
+GRANULARITIES = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+DEFAULT_GRANULARITY = "month"
+
+LABEL_FORMATS = {
+    "day": "%d %b",
+    "week": "%d %b",
+    "month": "%b %Y",
+}
+
+
+def report_params(params):
+    """
+    (timeframe, granularity) from query params, unknown values falling back to the defaults.
+    """
+    timeframe = params.get("timeframe", DEFAULT_TIMEFRAME)
+    granularity = params.get("granularity", DEFAULT_GRANULARITY)
+    if timeframe not in TIMEFRAME_DAYS:
+        timeframe = DEFAULT_TIMEFRAME
+    if granularity not in GRANULARITIES:
+        granularity = DEFAULT_GRANULARITY
+    return timeframe, granularity
+
+
+def timeframe_start(timeframe, today=None):
+    today = today or localdate()
+    return today - timedelta(days=TIMEFRAME_DAYS.get(timeframe, TIMEFRAME_DAYS[DEFAULT_TIMEFRAME]))
+
+
+def bucket_start(day, granularity):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    if granularity == "week":
+        return day + timedelta(days=7)
+    if granularity == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def bucket_range(start, end, granularity):
+    day = bucket_start(start, granularity)
+    while day <= end:
+        yield day
+        day = next_bucket(day, granularity)
+
+
+def report_summary(shop, branch, start_date, granularity=DEFAULT_GRANULARITY, end_date=None):
+    """
+    Revenue, profit, expense and sale count per day/week/month bucket.
+
+    Reads the DailyShopStats rollup with a single grouped query, so the cost
+    depends on the number of days in the window rather than on the number of
+    sales. Buckets are keyed by their real start date and empty ones are
+    filled with zeros. Cancelled sales are not counted.
+    """
+    end_date = end_date or localdate()
+    trunc = GRANULARITIES[granularity]
+
+    stats = DailyShopStats.objects.filter(shop=shop, day__gte=start_date, day__lte=end_date)
+    if branch:
+        stats = stats.filter(branch=branch)
+
+    rows = (
+        stats.annotate(period=trunc("day", output_field=DateField()))
+        .values("period")
+        .annotate(revenue=Sum("revenue"), profit=Sum("profit"), expense=Sum("expense"), count=Sum("sales_count"))
+        .order_by()
+    )
+
+    buckets = {
+        period: {"revenue": Decimal(0), "profit": Decimal(0), "expense": Decimal(0), "count": 0}
+        for period in bucket_range(start_date, end_date, granularity)
+    }
+    for row in rows:
+        buckets[row.pop("period")] = row
+
+    chart_data = [
+        {
+            "period": period.isoformat(),
+            "month": period.strftime(LABEL_FORMATS[granularity]),
+            "revenue": float(b["revenue"]),
+            "profit": float(b["profit"]),
+            "expense": float(b["expense"]),
+            "sales": b["count"],
+        }
+        for period, b in sorted(buckets.items())
+    ]
+
+    return {
+        "total_revenue": sum((b["revenue"] for b in buckets.values()), Decimal(0)),
+        "total_expense": sum((b["expense"] for b in buckets.values()), Decimal(0)),
+        "total_profit": sum((b["profit"] for b in buckets.values()), Decimal(0)),
+        "total_sales": sum(b["count"] for b in buckets.values()),
+        "granularity": granularity,
+        "chart_data": chart_data,
+    }
+
+
+def cached_report_summary(shop, branch, timeframe, granularity):
+    return get_or_compute(
+        report_cache_key(shop, branch, timeframe, granularity),
+        lambda: report_summary(shop, branch, timeframe_start(timeframe), granularity),
+    )
+
+
+def today_totals(shop, branch):
+    stats = DailyShopStats.objects.filter(shop=shop, day=localdate())
+    if branch:
+        stats = stats.filter(branch=branch)
+    totals = stats.aggregate(revenue=Sum("revenue"), profit=Sum("profit"), expense=Sum("expense"), sales=Sum("sales_count"))
+    return {
+        "revenue": float(totals["revenue"] or 0),
+        "profit": float(totals["profit"] or 0),
+        "expense": float(totals["expense"] or 0),
+        "sales": totals["sales"] or 0,
+    }
+
+
+def pending_sale_count(shop, branch):
+    sales = Sale.objects.filter(shop=shop, status="pending")
+    if branch:
+        sales = sales.filter(branch=branch)
+    return sales.count()
+
+
+def low_stock_count(shop, branch):
+    products = Product.objects.filter(shop=shop, quantity__lte=LOW_STOCK_THRESHOLD)
+    if branch:
+        products = products.filter(branch=branch)
+    return products.count()
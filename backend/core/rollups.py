@@ -0,0 +1,200 @@
+import operator
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+
+from django.apps import apps as global_apps
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .locks import lock_shops
+from .models import DailyProductStats, DailyShopStats
+from .report_cache import bump_report_versions
+
+# held by every rollup writer of a shop until it commits; see rebuild_rollups
+ROLLUP_LOCK = "rollups"
+
+KEY_FIELDS = {
+    DailyShopStats: ("shop_id", "branch_id", "day"),
+    DailyProductStats: ("shop_id", "branch_id", "product_id", "day"),
+}
+
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value or 0))
+
+
+def _rows():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def sale_rollup(sale, items=None):
+    """
+    What one sale adds to the rollup tables, as ``{(model, key): {field: amount}}``.
+
+    Cancelled sales add nothing. Pass the sale's items to include the
+    per-product rows as well.
+    """
+    rows = _rows()
+    if sale.status == "cancelled":
+        return rows
+
+    day = timezone.localdate(sale.created_at)
+    shop_row = rows[(DailyShopStats, (sale.shop_id, sale.branch_id, day))]
+    shop_row["revenue"] += _decimal(sale.total_amount)
+    shop_row["profit"] += _decimal(sale.profit_amount)
+    shop_row["sales_count"] += 1
+
+    for item in items or []:
+        product_row = rows[(DailyProductStats, (sale.shop_id, sale.branch_id, item.product_id, day))]
+        product_row["quantity"] += item.quantity
+        product_row["revenue"] += _decimal(item.total_price)
+        product_row["cost"] += _decimal(item.total_cost)
+    return rows
+
+
+def merge_rollups(rollups):
+    """
+    Sum several rollups (e.g. one per sale) so they can be applied at once.
+    """
+    rows = _rows()
+    for rollup in rollups:
+        for row_key, fields in rollup.items():
+            for field, amount in fields.items():
+                rows[row_key][field] += amount
+    return rows
+
+
+def expense_rollup(expense):
+    rows = _rows()
+    rows[(DailyShopStats, (expense.shop_id, expense.branch_id, expense.date))]["expense"] += _decimal(expense.amount)
+    return rows
+
+
+def _key_q(model, key):
+    return Q(**dict(zip(KEY_FIELDS[model], key)))
+
+
+def apply_rollup_delta(before, after):
+    """
+    Move the rollup tables from the ``before`` contribution to ``after``.
+
+    Missing rows are created with one ``INSERT ... ON CONFLICT DO NOTHING`` per
+    table, then every changed row is incremented with a single Case/When
+    UPDATE, so concurrent writers never overwrite each other's totals.
+
+    Call it inside the transaction that wrote the rows behind the delta: it
+    takes the shops' rollup lock, so a rebuild either sees those rows or
+    finishes before the delta is applied.
+    """
+    deltas = defaultdict(dict)
+    for row_key in before.keys() | after.keys():
+        model, key = row_key
+        old, new = before.get(row_key, {}), after.get(row_key, {})
+        changes = {field: new.get(field, 0) - old.get(field, 0) for field in old.keys() | new.keys()}
+        changes = {field: delta for field, delta in changes.items() if delta}
+        if changes:
+            deltas[model][key] = changes
+
+    lock_shops(ROLLUP_LOCK, {key[0] for rows in deltas.values() for key in rows})
+    for model, rows in deltas.items():
+        key_fields = KEY_FIELDS[model]
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key))) for key in rows], ignore_conflicts=True
+        )
+
+        updates = {}
+        for field in {field for changes in rows.values() for field in changes}:
+            updates[field] = Case(
+                *[
+                    When(_key_q(model, key), then=F(field) + changes[field])
+                    for key, changes in rows.items()
+                    if field in changes
+                ],
+                default=F(field),
+                output_field=model._meta.get_field(field),
+            )
+        model.objects.filter(reduce(operator.or_, [_key_q(model, key) for key in rows])).update(**updates)
+
+    # keys start with (shop_id, branch_id)
+    bump_report_versions({key[:2] for rows in deltas.values() for key in rows})
+
+
+@transaction.atomic
+def rebuild_rollups(start, end, shop_ids=None):
+    """
+    Recompute both rollup tables for days ``start``..``end`` from the raw rows.
+
+    Concurrent apply_rollup_delta calls wait until the rebuild commits, and the
+    rebuild waits for those already running, so no increment is lost between
+    reading the raw rows and replacing the rollup rows.
+    """
+    if shop_ids:
+        lock_shops(ROLLUP_LOCK, shop_ids)
+    elif connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"LOCK TABLE {DailyShopStats._meta.db_table}, {DailyProductStats._meta.db_table} IN EXCLUSIVE MODE"
+            )
+
+    counts = replace_rollups(global_apps, start, end, shop_ids)
+    bump_report_versions([(shop_id, None) for shop_id in shop_ids] if shop_ids else [(None, None)])
+    return counts
+
+
+def replace_rollups(apps, start, end, shop_ids=None):
+    """
+    The rebuild itself, with the models of ``apps``, so the migration that
+    backfills the tables can run it with its historical models. Returns the
+    number of shop and product rows written.
+    """
+    Sale, SaleItem, Expense = (apps.get_model("core", name) for name in ("Sale", "SaleItem", "Expense"))
+    DailyShopStats, DailyProductStats = (apps.get_model("core", name) for name in ("DailyShopStats", "DailyProductStats"))
+
+    sales = Sale.objects.exclude(status="cancelled").filter(created_at__date__range=(start, end))
+    expenses = Expense.objects.filter(date__range=(start, end))
+    items = SaleItem.objects.exclude(sale__status="cancelled").filter(sale__created_at__date__range=(start, end))
+    shop_stats = DailyShopStats.objects.filter(day__range=(start, end))
+    product_stats = DailyProductStats.objects.filter(day__range=(start, end))
+    if shop_ids:
+        sales = sales.filter(shop_id__in=shop_ids)
+        expenses = expenses.filter(shop_id__in=shop_ids)
+        items = items.filter(sale__shop_id__in=shop_ids)
+        shop_stats = shop_stats.filter(shop_id__in=shop_ids)
+        product_stats = product_stats.filter(shop_id__in=shop_ids)
+
+    shop_rows = {}
+    for row in (
+        sales.annotate(day=TruncDate("created_at"))
+        .values("shop_id", "branch_id", "day")
+        .annotate(revenue=Sum("total_amount"), profit=Sum("profit_amount"), sales_count=Count("id"))
+        .order_by()
+    ):
+        key = (row.pop("shop_id"), row.pop("branch_id"), row.pop("day"))
+        shop_rows[key] = DailyShopStats(shop_id=key[0], branch_id=key[1], day=key[2], **row)
+
+    for row in expenses.values("shop_id", "branch_id", "date").annotate(expense=Sum("amount")).order_by():
+        key = (row["shop_id"], row["branch_id"], row["date"])
+        stats = shop_rows.setdefault(key, DailyShopStats(shop_id=key[0], branch_id=key[1], day=key[2]))
+        stats.expense = row["expense"]
+
+    product_rows = [
+        DailyProductStats(
+            shop_id=row["sale__shop_id"], branch_id=row["sale__branch_id"], product_id=row["product_id"],
+            day=row["day"], quantity=row["quantity"], revenue=row["revenue"], cost=row["cost"],
+        )
+        for row in (
+            items.annotate(day=TruncDate("sale__created_at"))
+            .values("sale__shop_id", "sale__branch_id", "product_id", "day")
+            .annotate(quantity=Sum("quantity"), revenue=Sum("total_price"), cost=Sum("total_cost"))
+            .order_by()
+        )
+    ]
+
+    shop_stats.delete()
+    product_stats.delete()
+    DailyShopStats.objects.bulk_create(shop_rows.values(), batch_size=1000)
+    DailyProductStats.objects.bulk_create(product_rows, batch_size=1000)
+    return len(shop_rows), len(product_rows)
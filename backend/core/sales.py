@@ -0,0 +1,236 @@
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+from rest_framework import serializers
+
+from .models import Customer, Product, Sale, SaleItem
+from .rollups import apply_rollup_delta, merge_rollups, sale_rollup
+from .serializers import SaleSyncSerializer
+from .stock import line_quantities, lock_stock, shortage_detail, write_stock_changes
+
+# sales one batch confirm call may complete
+MAX_CONFIRM_BATCH = 500
+# sales one offline sync call may carry, and how many of them share a transaction
+MAX_SYNC_BATCH = 5000
+SYNC_CHUNK_SIZE = 1000
+# times a chunk is checked and written again after colliding with sales stored meanwhile
+SYNC_ATTEMPTS = 3
+SYNC_CONFLICT = "Another upload stored sales with the same ids or invoice numbers meanwhile; send this sale again."
+
+
+def sale_totals(sale_ids):
+    """
+    ``{sale_id: (total_amount, profit_amount)}`` from the sales' items, with
+    one grouped query. Sales without items are missing from the result.
+    """
+    rows = (
+        SaleItem.objects.filter(sale_id__in=sale_ids)
+        .values("sale_id")
+        .annotate(total=Sum("total_price"), cost=Sum("total_cost"))
+        .order_by()
+    )
+    return {row["sale_id"]: (row["total"], row["total"] - row["cost"]) for row in rows}
+
+
+def confirm_sales(sales):
+    """
+    Complete every non-cancelled sale of the ``sales`` queryset with its
+    total and profit computed from its items, and move the rollups by the
+    difference. Returns the confirmed sales.
+
+    Query count does not depend on how many sales are confirmed. The rows are
+    locked first, so confirming the same sale twice at once cannot apply its
+    rollup delta twice.
+    """
+    with transaction.atomic():
+        # pk order, so concurrent batches lock overlapping sales in the same order
+        confirmed = list(sales.select_for_update(of=("self",)).exclude(status="cancelled").order_by("pk"))
+        if not confirmed:
+            return []
+
+        totals = sale_totals([sale.pk for sale in confirmed])
+        rollup_before = merge_rollups(sale_rollup(sale) for sale in confirmed)
+        for sale in confirmed:
+            sale.total_amount, sale.profit_amount = totals.get(sale.pk, (Decimal(0), Decimal(0)))
+            sale.status = "completed"
+        Sale.objects.bulk_update(confirmed, ["total_amount", "profit_amount", "status"])
+        # the items did not change, so only the per-shop rows move
+        apply_rollup_delta(rollup_before, merge_rollups(sale_rollup(sale) for sale in confirmed))
+    return confirmed
+
+
+def _pk(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def sync_sales(entries, request, shop, branch):
+    """
+    Store sales a POS queued while it was offline. Returns one result per
+    entry, in order: its id and invoice number, ``status`` ("created",
+    "exists" or "rejected") and, when rejected, ``errors``.
+
+    Entries are handled SYNC_CHUNK_SIZE at a time. A chunk's products,
+    customers and already stored sales are loaded with one query each, every
+    sale is validated against them, and the accepted ones are written in one
+    transaction: bulk inserts, one stock UPDATE and one rollup delta. A sale
+    whose items exceed the stock left is rejected on its own. A sale already
+    stored with the same id and invoice number is reported as "exists", so a
+    POS can resend a batch whose response it never got. That holds even while
+    the first upload is still running: a chunk that collides with the sales
+    it stores is rolled back and checked again once they are committed. A
+    chunk that still collides after SYNC_ATTEMPTS tries is not stored; its
+    sales are rejected so the POS sends them again.
+    """
+    serializer = SaleSyncSerializer(context={"request": request})
+    seen_ids, seen_invoices = set(), set()
+    results = []
+    for start in range(0, len(entries), SYNC_CHUNK_SIZE):
+        results += _sync_chunk(
+            entries[start:start + SYNC_CHUNK_SIZE], serializer, shop, branch, request.user, seen_ids, seen_invoices,
+        )
+    return results
+
+
+def _sync_chunk(entries, serializer, shop, branch, employee, seen_ids, seen_invoices):
+    objects = [entry for entry in entries if isinstance(entry, dict)]
+    product_ids = {
+        _pk(line.get("product_id"))
+        for entry in objects if isinstance(entry.get("sale_items"), list)
+        for line in entry["sale_items"] if isinstance(line, dict)
+    }
+    customer_ids = {_pk(entry.get("customer_id")) for entry in objects}
+
+    # the same shop/branch scoping as single sales, one query per model for the whole chunk
+    fields = serializer.fields
+    products = fields["sale_items"].child.fields["product_id"].get_queryset().filter(pk__in=product_ids - {None})
+    customers = fields["customer_id"].get_queryset().filter(pk__in=customer_ids - {None})
+    serializer.context["preloaded"] = {
+        Product: {str(product.pk): product for product in products},
+        Customer: {str(customer.pk): customer for customer in customers},
+    }
+
+    for _ in range(SYNC_ATTEMPTS):
+        results, accepted, chunk_ids, chunk_invoices = _check_entries(entries, serializer, shop, seen_ids, seen_invoices)
+        if not accepted:
+            break
+        try:
+            _write_synced_sales(accepted, shop, branch, employee)
+            break
+        except IntegrityError:
+            # an overlapping request (e.g. a resend of this batch) stored some of these sales after
+            # the lookup; the chunk was rolled back, so check it again against the sales stored now
+            continue
+    else:
+        # still colliding: nothing of the chunk was stored, the POS can send it again
+        for result, _ in accepted:
+            if result["status"] == "created":
+                result.update(status="rejected", errors={"invoice_number": [SYNC_CONFLICT]})
+        return results
+
+    # the chunk's ids and invoices count as seen only once it is written
+    seen_ids.update(chunk_ids)
+    seen_invoices.update(chunk_invoices)
+    return results
+
+
+def _stored_sales(sale_ids, invoices):
+    stored, stored_invoices = {}, set()
+    for pk, invoice, shop_id in Sale.objects.filter(
+        Q(pk__in=sale_ids) | Q(invoice_number__in=invoices)
+    ).values_list("pk", "invoice_number", "shop_id"):
+        stored[str(pk)] = (invoice, shop_id)
+        stored_invoices.add(invoice)
+    return stored, stored_invoices
+
+
+def _check_entries(entries, serializer, shop, seen_ids, seen_invoices):
+    """
+    A result per entry, the accepted (result, data) pairs, and the ids and
+    invoice numbers seen once they are written.
+    """
+    sale_ids = {_pk(entry.get("id")) for entry in entries if isinstance(entry, dict)} - {None}
+    invoices = {str(entry["invoice_number"]) for entry in entries if isinstance(entry, dict) and entry.get("invoice_number")}
+    stored, stored_invoices = _stored_sales(sale_ids, invoices)
+    chunk_ids, chunk_invoices = set(seen_ids), set(seen_invoices)
+
+    results, accepted = [], []
+    for entry in entries:
+        result = {"id": None, "invoice_number": None}
+        results.append(result)
+        if isinstance(entry, dict):
+            result.update(id=entry.get("id"), invoice_number=entry.get("invoice_number"))
+            # checked before validation: a product deleted since the first upload must not reject it
+            if stored.get(_pk(entry.get("id"))) == (str(entry.get("invoice_number")), shop.pk):
+                result["status"] = "exists"
+                continue
+
+        try:
+            data = serializer.run_validation(entry)
+        except serializers.ValidationError as exc:
+            result.update(status="rejected", errors=exc.detail)
+            continue
+
+        sale_id, invoice = str(data["id"]), data["invoice_number"]
+        if sale_id in stored or invoice in stored_invoices:
+            error = "Another sale already uses this id or invoice number."
+        elif sale_id in chunk_ids or invoice in chunk_invoices:
+            error = "Duplicate of an earlier sale in this batch."
+        else:
+            chunk_ids.add(sale_id)
+            chunk_invoices.add(invoice)
+            accepted.append((result, data))
+            continue
+        result.update(status="rejected", errors={"invoice_number": [error]})
+    return results, accepted, chunk_ids, chunk_invoices
+
+
+def _write_synced_sales(accepted, shop, branch, employee):
+    with transaction.atomic():
+        available = lock_stock({line["product"].pk for _, data in accepted for line in data["sale_items"]})
+        taken = defaultdict(int)
+        sales, items, rollups, made_offline = [], [], [], []
+        for result, data in accepted:
+            wanted = line_quantities(data["sale_items"])
+            short = [pk for pk, qty in wanted.items() if qty > 0 and qty > available.get(pk, 0) - taken[pk]]
+            if short:
+                products = {line["product"].pk: line["product"] for line in data["sale_items"]}
+                result.update(status="rejected", errors=shortage_detail([
+                    {"product_id": str(pk), "product": products[pk].name, "requested": wanted[pk],
+                     "available": available.get(pk, 0) - taken[pk]}
+                    for pk in short
+                ]))
+                continue
+
+            for pk, qty in wanted.items():
+                taken[pk] += qty
+            total = sum((line["total_price"] for line in data["sale_items"]), Decimal(0))
+            cost = sum((line["total_cost"] for line in data["sale_items"]), Decimal(0))
+            sale = Sale(
+                id=data["id"], shop=shop, branch=branch, employee=employee, customer=data["customer"],
+                invoice_number=data["invoice_number"], status=data["status"],
+                total_amount=total, profit_amount=total - cost,
+            )
+            sale_items = [SaleItem(sale=sale, **line) for line in data["sale_items"]]
+            sales.append(sale)
+            items += sale_items
+            rollups.append((sale, sale_items))
+            if data.get("created_at"):
+                made_offline.append((sale, data["created_at"]))
+            result["status"] = "created"
+
+        if sales:
+            Sale.objects.bulk_create(sales)
+            # bulk_create stamps the upload time; sales made offline keep the time the POS sent
+            for sale, created_at in made_offline:
+                sale.created_at = created_at
+            Sale.objects.bulk_update([sale for sale, _ in made_offline], ["created_at"])
+            SaleItem.objects.bulk_create(items)
+            write_stock_changes(taken, shop.pk)
+            # created_at is final only now, so the rollups are built afterwards
+            apply_rollup_delta({}, merge_rollups(sale_rollup(sale, sale_items) for sale, sale_items in rollups))
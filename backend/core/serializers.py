@@ -1,8 +1,19 @@
+import uuid
+from collections import defaultdict
+
 from django.db import transaction
+from django.utils import timezone
 from djoser.serializers import UserCreateSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from .authentication import TenantRefreshToken
+from .catalog import PRODUCT_SYNC_FIELDS
+from .jobs import registry as job_registry
 from .models import *
+from .rollups import apply_rollup_delta, sale_rollup
+from .stock import apply_stock_changes, line_quantities, loaded_products
+from .utils import get_request_tenant
 from django.contrib.auth.models import User
 
 User = get_user_model()
@@ -33,6 +44,15 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         return user
 
 
+class TenantTokenObtainPairSerializer(TokenObtainPairSerializer):
+    # access tokens carry shop_id, branch_id and role (AUTH_MODE=jwt)
+    token_class = TenantRefreshToken
+
+
+class TenantTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = TenantRefreshToken
+
+
 class CustomUserSerializer(serializers.ModelSerializer):
     phone = serializers.CharField(source='profile.phone', read_only=True)
     full_name = serializers.CharField(source='profile.full_name', read_only=True)
@@ -48,7 +68,7 @@ class ProfileSerializer(serializers.ModelSerializer):
 
 
 class ShopSerializer(serializers.ModelSerializer):
-    owner = serializers.ReadOnlyField(source='owner.id')  # read-only, automatically set
+    owner = serializers.ReadOnlyField(source='owner_id')  # read-only, automatically set
 
     class Meta:
         model = Shop
@@ -107,8 +127,76 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['shop'] 
 
+class ProductSyncSerializer(serializers.ModelSerializer):
+    """
+    Compact product for catalog sync (GET /api/products/sync/): the category
+    is an id, and there is no description.
+    """
+    category_id = serializers.UUIDField(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = PRODUCT_SYNC_FIELDS
+        read_only_fields = fields
+
+class TenantPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField restricted to the request's shop (and branch for employees).
+
+    If a parent list serializer already loaded the candidates into
+    ``context["preloaded"][model]`` those instances are used instead of a
+    query per value.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get("request")
+        if request is None:
+            return queryset
+
+        shop, branch, _ = get_request_tenant(request)
+        if not shop:
+            return queryset.none()
+        queryset = queryset.filter(shop=shop)
+        if branch:
+            queryset = queryset.filter(branch=branch)
+        return queryset
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get("preloaded", {}).get(self.queryset.model)
+        if preloaded is None:
+            return super().to_internal_value(data)
+
+        try:
+            pk = str(uuid.UUID(str(data)))
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if pk not in preloaded:
+            self.fail("does_not_exist", pk_value=data)
+        return preloaded[pk]
+
+
+class SaleItemListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # resolve every product in the basket with one shop-scoped IN query, unless the
+        # caller already loaded the products of a whole batch (sync_sales)
+        if isinstance(data, list) and Product not in self.context.get("preloaded", {}):
+            product_ids = set()
+            for item in data:
+                try:
+                    product_ids.add(uuid.UUID(str(item["product_id"])))
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+            field = self.child.fields["product_id"]
+            products = field.get_queryset().filter(pk__in=product_ids).select_related("category")
+            self.context.setdefault("preloaded", {})[Product] = {str(p.pk): p for p in products}
+
+        return super().to_internal_value(data)
+
+
 class SaleItemSerializer(serializers.ModelSerializer):
-    product_id = serializers.PrimaryKeyRelatedField(
+    product_id = TenantPrimaryKeyRelatedField(
         queryset=Product.objects.all(), source="product"
     )
     product = ProductSerializer(read_only=True)
@@ -116,9 +204,10 @@ class SaleItemSerializer(serializers.ModelSerializer):
         model = SaleItem
         fields = "__all__"
         read_only_fields = ["id", "sale"]
+        list_serializer_class = SaleItemListSerializer
 
 class SaleSerializer(serializers.ModelSerializer):
-    customer_id = serializers.PrimaryKeyRelatedField(
+    customer_id = TenantPrimaryKeyRelatedField(
         queryset=Customer.objects.all(),
         source="customer"
     )
@@ -135,28 +224,105 @@ class SaleSerializer(serializers.ModelSerializer):
         fields = "__all__"  
         read_only_fields = ["id", "shop", "employee", "created_at"]
 
+    SALE_ITEM_FIELDS = ["quantity", "unit_price", "unit_cost", "total_price", "total_cost"]
+
     def create(self, validated_data):
         items_data = validated_data.pop("sale_items", [])
         sale = Sale.objects.create(**validated_data)
-        for item_data in items_data:
-            SaleItem.objects.create(sale=sale, **item_data)
+        items = SaleItem.objects.bulk_create([SaleItem(sale=sale, **item_data) for item_data in items_data])
+        # the response renders these items (and their already-loaded products) without re-reading them
+        sale._prefetched_objects_cache = {"sale_items": items}
         return sale
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         items_data = validated_data.pop("sale_items", None)
+        was_cancelled = instance.status == "cancelled"
+        existing_items = list(instance.sale_items.all())
+        rollup_before = sale_rollup(instance, existing_items)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
             
         instance.save()
 
-        if items_data is not None:
-            instance.sale_items.all().delete()
-            for item_data in items_data:
-                SaleItem.objects.create(sale=instance, **item_data)
+        is_cancelled = instance.status == "cancelled"
+        items = existing_items
+        if items_data is not None or was_cancelled != is_cancelled:
+            # stock held by the sale before and after the edit; cancelled sales hold none
+            old_stock = {} if was_cancelled else line_quantities(existing_items)
+            new_stock = {} if is_cancelled else line_quantities(
+                existing_items if items_data is None else items_data
+            )
 
+            if items_data is not None:
+                items = self.apply_sale_item_diff(instance, existing_items, items_data)
+            apply_stock_changes(
+                {
+                    product_id: new_stock.get(product_id, 0) - old_stock.get(product_id, 0)
+                    for product_id in old_stock.keys() | new_stock.keys()
+                },
+                instance.shop_id,
+                loaded_products(items_data or []),
+            )
+
+        apply_rollup_delta(rollup_before, sale_rollup(instance, items))
         return instance
 
+    def apply_sale_item_diff(self, sale, existing_items, items_data):
+        """
+        Match incoming lines to existing ones by product and write only what changed.
+        Returns the sale's items after the edit.
+        """
+        unmatched = defaultdict(list)
+        for item in existing_items:
+            unmatched[item.product_id].append(item)
+
+        to_create, to_update, kept = [], [], []
+        for item_data in items_data:
+            matches = unmatched[item_data["product"].pk]
+            if not matches:
+                to_create.append(SaleItem(sale=sale, **item_data))
+                continue
+
+            item = matches.pop(0)
+            kept.append(item)
+            changed = False
+            for field in self.SALE_ITEM_FIELDS:
+                if field in item_data and getattr(item, field) != item_data[field]:
+                    setattr(item, field, item_data[field])
+                    changed = True
+            if changed:
+                to_update.append(item)
+
+        to_delete = [item.pk for items in unmatched.values() for item in items]
+        if to_delete:
+            SaleItem.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            SaleItem.objects.bulk_update(to_update, self.SALE_ITEM_FIELDS)
+        if to_create:
+            SaleItem.objects.bulk_create(to_create)
+        return kept + to_create
+
+class SaleSyncSerializer(serializers.Serializer):
+    """
+    One sale of an offline batch (POST /api/sales/sync/). The POS assigns the
+    id and invoice number; totals are computed from the items. Uniqueness is
+    checked for the whole batch at once by core.sales.sync_sales.
+    ``created_at`` is when the POS made the sale, so reports book it on that
+    day; without it the upload time is used.
+    """
+    id = serializers.UUIDField()
+    invoice_number = serializers.CharField(max_length=100)
+    customer_id = TenantPrimaryKeyRelatedField(queryset=Customer.objects.all(), source="customer")
+    status = serializers.ChoiceField(choices=["pending", "completed"], default="pending")
+    created_at = serializers.DateTimeField(required=False)
+    sale_items = SaleItemSerializer(many=True, allow_empty=False)
+
+    def validate_created_at(self, value):
+        # a POS clock running ahead must not book sales in the future
+        return min(value, timezone.now())
+
 class InvoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Invoice
@@ -166,4 +332,39 @@ class ExpenseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
         fields = '__all__'
-        read_only_fields = ['id', 'shop','created_at']
\ No newline at end of file
+        read_only_fields = ['id', 'shop','created_at']
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'name', 'payload', 'status', 'attempts', 'max_attempts', 'run_at', 'result', 'error',
+            'wait_ms', 'run_ms', 'created_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class JobCreateSerializer(serializers.Serializer):
+    """
+    Queues one of the job types registered with a payload serializer, for the
+    request's shop and branch.
+    """
+    name = serializers.ChoiceField(choices=[])
+    payload = serializers.DictField(required=False, default=dict)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['name'].choices = sorted(n for n, t in job_registry.items() if t.payload_serializer)
+
+    def validate(self, attrs):
+        job_type = job_registry[attrs['name']]
+        _, _, role = get_request_tenant(self.context['request'])
+        if role not in job_type.roles:
+            raise serializers.ValidationError({"name": "Your role cannot run this job."})
+        payload = job_type.payload_serializer(data=attrs['payload'])
+        if not payload.is_valid():
+            raise serializers.ValidationError({"payload": payload.errors})
+        # the JSON form, e.g. dates as ISO strings
+        attrs['payload'] = dict(payload.data)
+        return attrs
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import evict_tokens
+from .db_pool import count_connection
+from .etags import bump_collection_versions
+from .models import Branch, Category, Customer, Product, ProductTombstone, Shop, ShopMembership
+from .utils import invalidate_user_tenants
+
+
+def _shop_user_ids(shop_id, owner_id=None):
+    user_ids = set(ShopMembership.objects.filter(shop_id=shop_id).values_list("user_id", flat=True))
+    if owner_id:
+        user_ids.add(owner_id)
+    return user_ids
+
+
+@receiver([post_save, post_delete], sender=ShopMembership)
+def membership_changed(sender, instance, **kwargs):
+    invalidate_user_tenants([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=Shop)
+def shop_changed(sender, instance, **kwargs):
+    invalidate_user_tenants(_shop_user_ids(instance.pk, instance.owner_id))
+    bump_collection_versions("shop", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Branch)
+def branch_changed(sender, instance, **kwargs):
+    invalidate_user_tenants(_shop_user_ids(instance.shop_id))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # every way of deleting a product (API, admin, cascades) leaves a tombstone for catalog sync
+    ProductTombstone.objects.create(product_id=instance.pk, shop_id=instance.shop_id, branch_id=instance.branch_id)
+
+
+# list ETags (core.etags) of the collections a saved or deleted row belongs to
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    bump_collection_versions("products", [instance.shop_id])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # deleting one also clears it from products with an UPDATE; product ETags include this version
+    bump_collection_versions("categories", [instance.shop_id])
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def customer_changed(sender, instance, **kwargs):
+    bump_collection_versions("customers", [instance.shop_id])
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # djoser's logout deletes the token
+    evict_tokens([instance.key])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # cached tokens carry the user; a login only touches last_login
+    if update_fields and set(update_fields) == {"last_login"}:
+        return
+    evict_tokens(Token.objects.filter(user=instance).values_list("key", flat=True))
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    count_connection(connection.alias)
@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from .etags import bump_collection_versions
+from .models import Product
+
+
+def line_quantities(lines):
+    """
+    Total units per product id for SaleItems or validated sale item dicts.
+    """
+    quantities = defaultdict(int)
+    for line in lines:
+        if isinstance(line, dict):
+            quantities[line["product"].pk] += line["quantity"]
+        else:
+            quantities[line.product_id] += line.quantity
+    return dict(quantities)
+
+
+def shortage_detail(shortages):
+    return {
+        "error": "; ".join(f"Not enough stock for {s['product']}. Available: {s['available']}" for s in shortages),
+        "shortages": shortages,
+    }
+
+
+def lock_stock(product_ids):
+    """
+    Lock the products' rows in primary key order and return ``{product_id: quantity}``.
+    """
+    return dict(
+        Product.objects.select_for_update()
+        .filter(pk__in=product_ids)
+        .order_by("pk")
+        .values_list("pk", "quantity")
+    )
+
+
+def write_stock_changes(changes, shop_id):
+    """
+    Take ``changes[product_id]`` units out of stock of the shop's products with
+    one UPDATE, without checking; the rows must be locked (lock_stock) and the
+    quantities checked.
+    """
+    changes = {product_id: qty for product_id, qty in changes.items() if qty}
+    if changes:
+        Product.objects.filter(pk__in=changes.keys()).update(
+            quantity=Case(
+                *[When(pk=pk, then=F("quantity") - qty) for pk, qty in changes.items()],
+                output_field=IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        # QuerySet.update sends no signals, so the product list ETags are changed here
+        bump_collection_versions("products", [shop_id])
+
+
+def apply_stock_changes(changes, shop_id, products=None):
+    """
+    Take ``changes[product_id]`` units out of stock (negative values put stock back).
+    The products belong to shop ``shop_id``.
+
+    Must run inside ``transaction.atomic()``. Every affected row is locked with a
+    single ``SELECT ... FOR UPDATE`` in primary key order, so two cashiers selling
+    overlapping baskets queue up instead of deadlocking, and all rows are then
+    decremented with one conditional UPDATE. If any product is short nothing is
+    written and a ValidationError lists every short line.
+
+    ``products`` maps product id to instances the caller already loaded (e.g.
+    during validation); the lock only reads quantities and those instances are
+    kept in sync instead of being fetched again.
+    """
+    changes = {product_id: qty for product_id, qty in changes.items() if qty}
+    if not changes:
+        return
+    products = products or {}
+
+    locked = lock_stock(changes.keys())
+
+    short = [pk for pk, quantity in locked.items() if changes[pk] > 0 and changes[pk] > quantity]
+    if short:
+        names = {pk: product.name for pk, product in products.items()}
+        missing = [pk for pk in short if pk not in names]
+        if missing:
+            names.update(Product.objects.filter(pk__in=missing).values_list("pk", "name"))
+        raise serializers.ValidationError(shortage_detail([
+            {"product_id": str(pk), "product": names[pk], "requested": changes[pk], "available": locked[pk]}
+            for pk in short
+        ]))
+
+    write_stock_changes(changes, shop_id)
+
+    for pk, product in products.items():
+        if pk in locked:
+            product.quantity = locked[pk] - changes.get(pk, 0)
+
+
+def loaded_products(lines):
+    return {line["product"].pk: line["product"] for line in lines if isinstance(line, dict)}
+
+
+def reserve_stock(lines, shop_id):
+    apply_stock_changes(line_quantities(lines), shop_id, loaded_products(lines))
+
+
+def release_stock(lines, shop_id):
+    quantities = line_quantities(lines)
+    apply_stock_changes({pk: -qty for pk, qty in quantities.items()}, shop_id, loaded_products(lines))
@@ -0,0 +1,41 @@
+"""
+Job types run by the background workers; see core/jobs.py.
+"""
+from datetime import date, timedelta
+
+from rest_framework import serializers
+
+from .jobs import job
+from .reports import DEFAULT_GRANULARITY, DEFAULT_TIMEFRAME, GRANULARITIES, TIMEFRAME_DAYS, cached_report_summary
+from .rollups import rebuild_rollups
+
+
+class ReportJobPayload(serializers.Serializer):
+    timeframe = serializers.ChoiceField(choices=list(TIMEFRAME_DAYS), default=DEFAULT_TIMEFRAME)
+    granularity = serializers.ChoiceField(choices=list(GRANULARITIES), default=DEFAULT_GRANULARITY)
+
+
+@job("report", payload_serializer=ReportJobPayload, roles=("owner", "employee"))
+def report(job, timeframe, granularity):
+    # also leaves the report in the report cache for the next GET
+    return cached_report_summary(job.shop, job.branch, timeframe, granularity)
+
+
+class RebuildRollupsPayload(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+
+    def validate(self, attrs):
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must not be after end")
+        if attrs["end"] - attrs["start"] > timedelta(days=366):
+            raise serializers.ValidationError("At most one year per job")
+        return attrs
+
+
+@job("rebuild_rollups", payload_serializer=RebuildRollupsPayload, roles=("owner",))
+def rebuild_shop_rollups(job, start, end):
+    shop_rows, product_rows = rebuild_rollups(
+        date.fromisoformat(start), date.fromisoformat(end), [job.shop_id] if job.shop_id else None
+    )
+    return {"shop_rows": shop_rows, "product_rows": product_rows}
@@ -0,0 +1,200 @@
+"""
+Query-count budgets for every route in core/urls.py.
+
+Each endpoint is called against a seeded tenant holding 10, 100 and 1000
+rows per table. The number of queries must stay within the endpoint's
+budget and must not change with the data size, so an N+1 regression fails
+the build. Only the local test database is used (SQLite or PostgreSQL).
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import *
+from .rollups import rebuild_rollups
+
+User = get_user_model()
+
+LIST_SIZES = (10, 100, 1000)
+ITEMS_PER_SALE = 3
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.random = random.Random(1234)
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        Profile.objects.create(user=cls.owner, full_name="Owner")
+        cls.shop = Shop.objects.create(name="Budget Shop", owner=cls.owner)
+        cls.branches = [Branch.objects.create(shop=cls.shop, branch_name=f"Branch {i}") for i in range(2)]
+        cls.categories = Category.objects.bulk_create(
+            [Category(shop=cls.shop, branch=cls.branches[0], name=f"Category {i}") for i in range(5)]
+        )
+        cls.employee = User.objects.create_user(username="cashier", password="x")
+        Profile.objects.create(user=cls.employee, full_name="Cashier")
+        ShopMembership.objects.create(
+            user=cls.employee, shop=cls.shop, branch=cls.branches[0], role="employee", status="approved"
+        )
+        cls.owner_token = Token.objects.create(user=cls.owner).key
+        cls.employee_token = Token.objects.create(user=cls.employee).key
+
+    def setUp(self):
+        cache.clear()
+        self.seeded = 0
+        self.owner_client = self.client_for(self.owner_token)
+        self.employee_client = self.client_for(self.employee_token)
+
+    def client_for(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        return client
+
+    def seed_to(self, size):
+        """
+        Top every tenant table up to ``size`` rows.
+        """
+        start, count = self.seeded, size - self.seeded
+        rnd = self.random
+        branch = self.branches[0]
+
+        users = User.objects.bulk_create([User(username=f"member{start + i}") for i in range(count)])
+        Profile.objects.bulk_create([Profile(user=u, full_name=f"Member {u.username}") for u in users])
+        ShopMembership.objects.bulk_create([
+            ShopMembership(
+                user=u, shop=self.shop, branch=branch, role="employee",
+                status="approved" if i % 2 else "pending",
+            )
+            for i, u in enumerate(users)
+        ])
+
+        products = Product.objects.bulk_create([
+            Product(
+                shop=self.shop, branch=branch, category=rnd.choice(self.categories), name=f"Product {start + i}",
+                cost_price=Decimal("5.00"), selling_price=Decimal("8.00"), quantity=10_000,
+            )
+            for i in range(count)
+        ])
+        customers = Customer.objects.bulk_create([
+            Customer(shop=self.shop, branch=branch, full_name=f"Customer {start + i}") for i in range(count)
+        ])
+        sales = Sale.objects.bulk_create([
+            Sale(
+                shop=self.shop, branch=branch, employee=self.employee, customer=rnd.choice(customers),
+                total_amount=Decimal("24.00"), profit_amount=Decimal("9.00"),
+                invoice_number=f"INV-{start + i}", status=rnd.choice(["pending", "completed"]),
+            )
+            for i in range(count)
+        ])
+        items = SaleItem.objects.bulk_create([
+            SaleItem(
+                sale=sale, product=rnd.choice(products), quantity=1, unit_price=Decimal("8.00"),
+                unit_cost=Decimal("5.00"), total_price=Decimal("8.00"), total_cost=Decimal("5.00"),
+            )
+            for sale in sales
+            for _ in range(ITEMS_PER_SALE)
+        ])
+        Invoice.objects.bulk_create([Invoice(sale=sale) for sale in sales])
+        Expense.objects.bulk_create([
+            Expense(
+                shop=self.shop, branch=branch, title=f"Expense {start + i}", amount=Decimal("12.50"),
+                date=date.today() - timedelta(days=rnd.randrange(365)),
+            )
+            for i in range(count)
+        ])
+        rebuild_rollups(date.today() - timedelta(days=400), date.today())
+
+        self.seeded = size
+        self.last_products, self.last_customers = products, customers
+        self.pending = ShopMembership.objects.filter(shop=self.shop, status="pending").first()
+        self.removable = ShopMembership.objects.filter(shop=self.shop, status="approved").exclude(user=self.employee).first()
+
+    def endpoints(self):
+        """
+        (name, client, method, path, payload, max queries)
+        """
+        product, customer = self.last_products[0], self.last_customers[0]
+        sale = Sale.objects.filter(shop=self.shop, status="pending").first()
+        joiner = User.objects.create_user(username=f"joiner{self.seeded}", password="x")
+        Profile.objects.create(user=joiner, full_name="Joiner")
+        joiner_client = self.client_for(Token.objects.create(user=joiner).key)
+        basket = {
+            "customer_id": str(customer.id),
+            "total_amount": "24.00",
+            "invoice_number": f"INV-NEW-{self.seeded}",
+            "sale_items": [
+                {
+                    "product_id": str(p.id), "quantity": 1, "unit_price": "8.00", "unit_cost": "5.00",
+                    "total_price": "8.00", "total_cost": "5.00",
+                }
+                for p in self.last_products[:ITEMS_PER_SALE]
+            ],
+        }
+        owner, employee = self.owner_client, self.employee_client
+        return [
+            ("home", owner, "get", "/", None, 0),
+            ("profiles", owner, "get", "/api/profiles/", None, 1),
+            ("shops", owner, "get", "/api/shops/", None, 1),
+            ("shops-me", owner, "get", "/api/shops/me/", None, 1),
+            ("branches", owner, "get", "/api/branches/", None, 1),
+            ("customers", employee, "get", "/api/customers/", None, 1),
+            ("customer-detail", employee, "get", f"/api/customers/{customer.id}/", None, 1),
+            ("categories", employee, "get", "/api/categories/", None, 1),
+            ("products", employee, "get", "/api/products/", None, 1),
+            ("product-detail", employee, "get", f"/api/products/{product.id}/", None, 1),
+            ("sales", employee, "get", "/api/sales/", None, 2),
+            ("sales-pending", employee, "get", "/api/sales/?status=pending", None, 2),
+            ("sale-detail", employee, "get", f"/api/sales/{sale.id}/", None, 2),
+            ("sale-create", employee, "post", "/api/sales/", basket, 13),
+            ("sale-confirm", employee, "post", f"/api/sales/{sale.id}/confirm/", None, 5),
+            ("sale-items", employee, "get", "/api/sale-items/", None, 1),
+            ("invoices", owner, "get", "/api/invoices/", None, 1),
+            ("expenses", employee, "get", "/api/expenses/", None, 1),
+            ("expense-create", employee, "post", "/api/expenses/",
+             {"title": "Rent", "amount": "30.00", "date": date.today().isoformat()}, 5),
+            ("shopmembership", employee, "get", "/api/shopmembership/", None, 1),
+            ("report-summary", owner, "get", "/api/reports/summary/?timeframe=12months", None, 1),
+            ("report-summary-branch", employee, "get", "/api/reports/summary/?timeframe=30days&granularity=day", None, 1),
+            ("my-shop", employee, "get", "/api/my-shop/", None, 0),
+            ("shop-search", owner, "get", "/api/shop_search/?q=Budget", None, 1),
+            ("join-shop", joiner_client, "post", "/api/join_shop/", {"shop": str(self.shop.id)}, 4),
+            ("join-requests", owner, "get", "/api/join-requests/", None, 1),
+            ("handle-join-request", owner, "post", f"/api/join-requests/{self.pending.id}/handle/",
+             {"action": "approve", "branch_id": str(self.branches[0].id)}, 5),
+            ("employees", owner, "get", "/api/employees/", None, 2),
+            ("employees-branch", employee, "get", "/api/employees/", None, 3),
+            ("employee-delete", owner, "delete", f"/api/employees/{self.removable.id}/", None, 2),
+            ("check-membership", owner, "get", "/api/check-membership/", None, 2),
+            ("shop-branches", owner, "get", f"/api/shop-branches/?shop_id={self.shop.id}", None, 1),
+        ]
+
+    def test_query_budgets(self):
+        counts = {}
+        for size in LIST_SIZES:
+            self.seed_to(size)
+            # start every size from the same cache state: tokens/tenants warm, no cached reports
+            cache.clear()
+            for client in (self.owner_client, self.employee_client):
+                client.get("/api/my-shop/")
+            for name, client, method, path, payload, budget in self.endpoints():
+                with self.subTest(endpoint=name, size=size):
+                    with CaptureQueriesContext(connection) as ctx:
+                        res = getattr(client, method)(path, payload, format="json")
+                    self.assertLess(res.status_code, 400, f"{name}: {res.status_code} {res.content[:300]}")
+                    self.assertLessEqual(
+                        len(ctx), budget,
+                        f"{name} ran {len(ctx)} queries (budget {budget}):\n"
+                        + "\n".join(q["sql"][:200] for q in ctx.captured_queries),
+                    )
+                    counts.setdefault(name, {})[size] = len(ctx)
+
+        for name, by_size in counts.items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(len(set(by_size.values())), 1, f"{name} query count grows with data: {by_size}")
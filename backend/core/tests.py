@@ -1,3 +1,986 @@
-from django.test import TestCase
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from shopmate.database import default_database
+
+from .authentication import TenantJWTAuthentication, local_tokens
+from .catalog import encode_token
+from .db_router import ReplicaRouter, is_pinned, replica_allowed, replica_reads
+from .jobs import claim_jobs, enqueue, registry, requeue_stale_jobs, run_due_jobs, run_job
+from .ids import uuid7
+from .management.commands.check_indexes import find_index
+from .models import *
+from .reports import report_summary
+from .rollups import rebuild_rollups
+from .sales import SYNC_ATTEMPTS, _stored_sales
+from .serializers import TenantTokenObtainPairSerializer, TenantTokenRefreshSerializer
+from .utils import get_user_tenant
+from .views import JWTLogoutView, ReportSummary
+
+User = get_user_model()
+
+
+class ShopTestCase(TestCase):
+    """
+    Owner + one branch employee with token clients, shared by the API tests.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="pass12345")
+        self.shop = Shop.objects.create(name="Corner Shop", owner=self.owner)
+        self.branch = Branch.objects.create(shop=self.shop, branch_name="Main")
+
+        self.employee = User.objects.create_user(username="cashier", password="pass12345")
+        self.membership = ShopMembership.objects.create(
+            user=self.employee, shop=self.shop, branch=self.branch, role="employee", status="approved"
+        )
+
+        self.owner_client = self.client_for(self.owner)
+        self.employee_client = self.client_for(self.employee)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+        return client
+
+
+class TenantResolutionTests(ShopTestCase):
+    def test_owner_and_employee_tenants(self):
+        self.assertEqual(get_user_tenant(self.owner), (self.shop, None, "owner"))
+        self.assertEqual(get_user_tenant(self.employee), (self.shop, self.branch, "employee"))
+
+    def test_tenant_is_cached(self):
+        get_user_tenant(self.employee)
+        with self.assertNumQueries(0):
+            get_user_tenant(self.employee)
+
+    def test_membership_change_invalidates_cache(self):
+        self.assertEqual(get_user_tenant(self.employee).shop, self.shop)
+        self.membership.status = "rejected"
+        self.membership.save()
+        self.assertIsNone(get_user_tenant(self.employee).shop)
+
+    def test_branch_scoped_list(self):
+        Customer.objects.create(shop=self.shop, branch=self.branch, full_name="In branch")
+        Customer.objects.create(shop=self.shop, full_name="Shop wide")
+
+        res = self.employee_client.get("/api/customers/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([c["full_name"] for c in res.json()["results"]], ["In branch"])
+        self.assertEqual(len(self.owner_client.get("/api/customers/").json()["results"]), 2)
+
+    def test_cursor_pagination_walks_every_row_once(self):
+        created = [Customer.objects.create(shop=self.shop, full_name=f"Customer {i}") for i in range(5)]
+
+        seen, url = [], "/api/customers/?page_size=2"
+        while url:
+            page = self.owner_client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 2)
+            seen += [c["id"] for c in page["results"]]
+            url = page["next"]
+        self.assertEqual(seen, [str(c.id) for c in reversed(created)])
+
+    def test_expenses_are_listed_by_date(self):
+        days = [date(2026, 10, 3), date(2026, 10, 5), date(2026, 10, 1), date(2026, 10, 5), date(2026, 10, 3)]
+        created = [
+            Expense.objects.create(shop=self.shop, title=f"Expense {i}", amount="1.00", date=day)
+            for i, day in enumerate(days)
+        ]
+
+        seen, url = [], "/api/expenses/?page_size=2"
+        while url:
+            page = self.owner_client.get(url).json()
+            seen += [e["id"] for e in page["results"]]
+            url = page["next"]
+        # a backdated expense sits under its own date, the latest entered first within a day
+        self.assertEqual(seen, [str(created[i].id) for i in (3, 1, 4, 0, 2)])
+
+
+class SaleTestCase(ShopTestCase):
+    """
+    Adds a customer and three products with 10 in stock each.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(shop=self.shop, branch=self.branch, full_name="Walk-in")
+        self.products = [
+            Product.objects.create(
+                shop=self.shop, branch=self.branch, name=f"Item {i}",
+                cost_price="5.00", selling_price="8.00", quantity=10,
+            )
+            for i in range(3)
+        ]
+
+    def sale_payload(self, quantities, invoice="INV-1"):
+        return {
+            "customer_id": str(self.customer.id),
+            "total_amount": "0.00",
+            "invoice_number": invoice,
+            "sale_items": [
+                {
+                    "product_id": str(product.id),
+                    "quantity": qty,
+                    "unit_price": "8.00",
+                    "unit_cost": "5.00",
+                    "total_price": f"{8 * qty}.00",
+                    "total_cost": f"{5 * qty}.00",
+                }
+                for product, qty in zip(self.products, quantities)
+            ],
+        }
+
+    def assert_rollups_match_rebuild(self):
+        # incremental updates may leave all-zero rows behind; they carry no data
+        def snapshot():
+            return (
+                sorted(
+                    DailyShopStats.objects.exclude(revenue=0, profit=0, expense=0, sales_count=0)
+                    .values_list("branch_id", "day", "revenue", "profit", "expense", "sales_count")
+                ),
+                sorted(
+                    DailyProductStats.objects.exclude(quantity=0, revenue=0, cost=0)
+                    .values_list("product_id", "day", "quantity", "revenue", "cost")
+                ),
+            )
+
+        incremental = snapshot()
+        rebuild_rollups(date(2000, 1, 1), date(2100, 1, 1))
+        self.assertEqual(incremental, snapshot())
+        return incremental
+
+
+class SaleStockTests(SaleTestCase):
+    def test_create_sale_decrements_stock(self):
+        res = self.employee_client.post("/api/sales/", self.sale_payload([1, 2, 3]), format="json")
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(
+            [p.quantity for p in Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by("name")],
+            [9, 8, 7],
+        )
+
+    def test_short_line_rejects_whole_sale(self):
+        res = self.employee_client.post("/api/sales/", self.sale_payload([1, 11, 12]), format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual({s["product"] for s in res.json()["shortages"]}, {"Item 1", "Item 2"})
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(set(Product.objects.values_list("quantity", flat=True)), {10})
+
+    def test_update_applies_item_diff_and_net_stock(self):
+        res = self.employee_client.post("/api/sales/", self.sale_payload([1, 2, 3]), format="json")
+        sale_id = res.json()["id"]
+        kept = SaleItem.objects.get(sale_id=sale_id, product=self.products[0])
+
+        payload = self.sale_payload([4, 0, 0])
+        payload["sale_items"] = payload["sale_items"][:1]
+        res = self.employee_client.put(f"/api/sales/{sale_id}/", payload, format="json")
+        self.assertEqual(res.status_code, 200, res.content)
+
+        items = SaleItem.objects.filter(sale_id=sale_id)
+        self.assertEqual([(i.pk, i.quantity) for i in items], [(kept.pk, 4)])
+        self.assertEqual(
+            [p.quantity for p in Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by("name")],
+            [6, 10, 10],
+        )
+
+    def test_cancelling_sale_restores_stock(self):
+        res = self.employee_client.post("/api/sales/", self.sale_payload([1, 2, 3]), format="json")
+        res = self.employee_client.patch(f"/api/sales/{res.json()['id']}/", {"status": "cancelled"}, format="json")
+        self.assertEqual(res.status_code, 200, res.content)
+        self.assertEqual(set(Product.objects.values_list("quantity", flat=True)), {10})
+
+    def test_sale_queries_do_not_grow_with_basket(self):
+        counts = []
+        for invoice, quantities in (("INV-A", [1]), ("INV-B", [1, 1, 1])):
+            self.employee_client.get("/api/customers/")  # warm the tenant/token lookups equally
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.employee_client.post("/api/sales/", self.sale_payload(quantities, invoice), format="json")
+            self.assertEqual(res.status_code, 201, res.content)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_products_from_other_shops_are_rejected(self):
+        other_owner = User.objects.create_user(username="other", password="pass12345")
+        other_shop = Shop.objects.create(name="Other", owner=other_owner)
+        self.products[0] = Product.objects.create(shop=other_shop, name="Foreign", selling_price="1.00", quantity=5)
+
+        res = self.employee_client.post("/api/sales/", self.sale_payload([1, 1]), format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("product_id", res.json()["sale_items"][0])
+
+
+class SaleListTests(SaleTestCase):
+    def test_sale_list_queries_do_not_grow_with_rows(self):
+        category = Category.objects.create(shop=self.shop, branch=self.branch, name="Snacks")
+        Product.objects.filter(pk__in=[p.pk for p in self.products]).update(category=category)
+
+        counts = []
+        for invoice in ("INV-A", "INV-B", "INV-C"):
+            self.employee_client.post("/api/sales/", self.sale_payload([1, 1, 1], invoice), format="json")
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.employee_client.get("/api/sales/")
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.json()["results"][0]["sale_items"][0]["product"]["category"]["name"], "Snacks")
+            counts.append(len(ctx))
+        self.assertEqual(len(set(counts)), 1)
+
+
+class ConfirmSalesTests(SaleTestCase):
+    def test_confirm_computes_totals_from_items(self):
+        sale_id = self.employee_client.post("/api/sales/", self.sale_payload([1, 2, 3]), format="json").json()["id"]
+        res = self.employee_client.post(
+            f"/api/sales/{sale_id}/confirm/", {"total_amount": "1.00", "profit_amount": "999.00"}, format="json"
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.json()["total_amount"], res.json()["profit_amount"]), ("48.00", "18.00"))
+        sale = Sale.objects.get(pk=sale_id)
+        self.assertEqual((sale.status, sale.total_amount, sale.profit_amount), ("completed", 48, 18))
+        self.assertEqual(self.employee_client.post("/api/sales/not-a-uuid/confirm/").status_code, 404)
+        self.assertEqual(self.employee_client.post(f"/api/sales/{uuid.uuid4()}/confirm/").status_code, 404)
+        shop_rows, _ = self.assert_rollups_match_rebuild()
+        self.assertEqual((shop_rows[0][2], shop_rows[0][3]), (48, 18))
+
+    def test_batch_confirm(self):
+        ids = [
+            self.employee_client.post("/api/sales/", self.sale_payload([1, 1, 1], f"INV-{n}"), format="json").json()["id"]
+            for n in range(3)
+        ]
+        self.employee_client.patch(f"/api/sales/{ids[2]}/", {"status": "cancelled"}, format="json")
+        self.assertEqual(self.employee_client.post(f"/api/sales/{ids[2]}/confirm/").status_code, 400)
+
+        unknown = str(uuid.uuid4())
+        with self.assertNumQueries(7):  # 5, plus the savepoint pair of the atomic block
+            res = self.employee_client.post("/api/sales/confirm/", {"ids": ids + [unknown]}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(sorted(c["id"] for c in res.json()["confirmed"]), sorted(ids[:2]))
+        self.assertEqual({c["total_amount"] for c in res.json()["confirmed"]}, {"24.00"})
+        self.assertEqual(sorted(res.json()["skipped"]), sorted([ids[2], unknown]))
+        self.assertEqual(Sale.objects.filter(status="completed").count(), 2)
+        self.assert_rollups_match_rebuild()
+
+        res = self.employee_client.post("/api/sales/confirm/", {"ids": ["not-a-uuid"]}, format="json")
+        self.assertEqual(res.status_code, 400)
+
+
+class SaleSyncTests(SaleTestCase):
+    def sync_entry(self, quantities, invoice, **extra):
+        entry = self.sale_payload(quantities, invoice)
+        del entry["total_amount"]
+        return {"id": str(uuid7()), **entry, **extra}
+
+    def test_offline_sync(self):
+        entries = [
+            self.sync_entry([1, 2], "POS-1"),
+            self.sync_entry([2, 0, 1], "POS-2", status="completed"),
+            self.sync_entry([8], "POS-3"),  # only 7 of product 0 left by now
+            self.sync_entry([1], "POS-1"),  # invoice already used in this batch
+            {**self.sync_entry([1], "POS-4"), "customer_id": str(uuid.uuid4())},
+            "not a sale",
+        ]
+        res = self.employee_client.post("/api/sales/sync/", {"sales": entries}, format="json")
+        self.assertEqual(res.status_code, 200, res.content)
+        body = res.json()
+        self.assertEqual((body["created"], body["exists"], body["rejected"]), (2, 0, 4))
+        statuses = [r["status"] for r in body["results"]]
+        self.assertEqual(statuses, ["created", "created", "rejected", "rejected", "rejected", "rejected"])
+        self.assertEqual(body["results"][2]["errors"]["shortages"][0]["available"], 7)
+        self.assertIn("customer_id", body["results"][4]["errors"])
+
+        sale = Sale.objects.get(pk=entries[1]["id"])
+        self.assertEqual((sale.status, sale.total_amount, sale.profit_amount, sale.employee), ("completed", 24, 9, self.employee))
+        self.assertEqual(
+            [p.quantity for p in Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by("name")],
+            [7, 8, 9],
+        )
+        self.assert_rollups_match_rebuild()
+
+        # the POS never saw the response and sends the batch again
+        res = self.employee_client.post("/api/sales/sync/", {"sales": entries[:2]}, format="json")
+        self.assertEqual(res.json()["exists"], 2)
+        self.assertEqual(Sale.objects.count(), 2)
+
+        clash = self.sync_entry([1], "POS-1")
+        self.assertEqual(
+            self.employee_client.post("/api/sales/sync/", {"sales": [clash]}, format="json").json()["rejected"], 1
+        )
+
+    def test_offline_sync_resend_overlapping_first_upload(self):
+        entries = [self.sync_entry([1], "POS-1"), self.sync_entry([1], "POS-2")]
+        self.employee_client.post("/api/sales/sync/", {"sales": entries[:1]}, format="json")
+
+        # the resend looked for stored sales before the first upload had committed POS-1
+        with mock.patch(
+            "core.sales._stored_sales",
+            side_effect=lambda *args: ({}, set()) if stale.call_count == 1 else _stored_sales(*args),
+        ) as stale:
+            res = self.employee_client.post("/api/sales/sync/", {"sales": entries}, format="json")
+        self.assertEqual(res.status_code, 200, res.content)
+        self.assertEqual([r["status"] for r in res.json()["results"]], ["exists", "created"])
+        self.assertEqual(stale.call_count, 2)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).quantity, 8)
+        self.assert_rollups_match_rebuild()
+
+    def test_offline_sync_gives_up_on_a_chunk_that_keeps_colliding(self):
+        entries = [self.sync_entry([1], "POS-1"), self.sync_entry([1], "POS-2")]
+        self.employee_client.post("/api/sales/sync/", {"sales": entries[:1]}, format="json")
+
+        with mock.patch("core.sales._stored_sales", return_value=({}, set())) as stale:
+            res = self.employee_client.post("/api/sales/sync/", {"sales": entries}, format="json")
+        self.assertEqual(res.status_code, 200, res.content)
+        self.assertEqual([r["status"] for r in res.json()["results"]], ["rejected", "rejected"])
+        self.assertEqual(stale.call_count, SYNC_ATTEMPTS)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).quantity, 9)
+        self.assert_rollups_match_rebuild()
+
+        # the resend after it is answered normally
+        res = self.employee_client.post("/api/sales/sync/", {"sales": entries}, format="json")
+        self.assertEqual([r["status"] for r in res.json()["results"]], ["exists", "created"])
+
+    def test_offline_sync_keeps_the_time_of_sale(self):
+        made = datetime(2026, 1, 5, 9, 30, tzinfo=dt_timezone.utc)
+        entries = [
+            self.sync_entry([1], "POS-1", created_at=made.isoformat()),
+            self.sync_entry([1], "POS-2", created_at="2999-01-01T00:00:00Z"),  # a POS clock far ahead
+            self.sync_entry([1], "POS-3"),
+        ]
+        res = self.employee_client.post("/api/sales/sync/", {"sales": entries}, format="json")
+        self.assertEqual(res.json()["created"], 3, res.content)
+
+        times = {sale.invoice_number: sale.created_at for sale in Sale.objects.all()}
+        self.assertEqual(times["POS-1"], made)
+        self.assertLessEqual(times["POS-2"], datetime.now(dt_timezone.utc))
+        self.assertGreater(times["POS-3"], made)
+        shop_rows, _ = self.assert_rollups_match_rebuild()
+        self.assertIn(date(2026, 1, 5), [row[1] for row in shop_rows])
+
+    def test_offline_sync_queries_do_not_grow_with_batch(self):
+        Product.objects.update(quantity=1000)
+        counts = []
+        for size in (2, 20):
+            entries = [self.sync_entry([1, 1, 1], f"POS-{size}-{n}") for n in range(size)]
+            self.employee_client.get("/api/customers/")  # warm the tenant/token lookups equally
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.employee_client.post("/api/sales/sync/", {"sales": entries}, format="json")
+            self.assertEqual(res.json()["created"], size, res.content)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+
+class RollupTests(SaleTestCase):
+    def test_rollups_follow_sale_and_expense_writes(self):
+        sale_id = self.employee_client.post("/api/sales/", self.sale_payload([1, 2, 3]), format="json").json()["id"]
+        self.employee_client.post(f"/api/sales/{sale_id}/confirm/", format="json")
+        self.employee_client.post("/api/sales/", self.sale_payload([1, 1, 1], "INV-2"), format="json")
+        expense = self.employee_client.post(
+            "/api/expenses/", {"title": "Rent", "amount": "30.00", "date": "2026-10-01"}, format="json"
+        ).json()
+        self.employee_client.patch(f"/api/expenses/{expense['id']}/", {"amount": "45.00"}, format="json")
+
+        shop_rows, product_rows = self.assert_rollups_match_rebuild()
+        self.assertEqual(sum(row[5] for row in shop_rows), 2)
+        self.assertEqual(sum(row[4] for row in shop_rows), 45)
+        self.assertEqual(sum(row[2] for row in product_rows), 9)
+
+    def test_rollups_drop_cancelled_and_deleted_sales(self):
+        first = self.employee_client.post("/api/sales/", self.sale_payload([1, 2, 3]), format="json").json()["id"]
+        second = self.employee_client.post("/api/sales/", self.sale_payload([1, 1, 1], "INV-2"), format="json").json()["id"]
+        self.employee_client.patch(f"/api/sales/{first}/", {"status": "cancelled"}, format="json")
+        self.employee_client.delete(f"/api/sales/{second}/")
+
+        shop_rows, product_rows = self.assert_rollups_match_rebuild()
+        self.assertEqual(shop_rows, [])
+        self.assertEqual(product_rows, [])
+
+
+class IdempotencyTests(SaleTestCase):
+    def test_idempotency_key_replays_sale(self):
+        payload = self.sale_payload([1, 2, 3])
+        first = self.employee_client.post("/api/sales/", payload, format="json", HTTP_IDEMPOTENCY_KEY="pos-1-0001")
+        self.assertEqual(first.status_code, 201, first.content)
+
+        with self.assertNumQueries(1):  # the stored response; no serializer, no Product rows
+            retry = self.employee_client.post("/api/sales/", payload, format="json", HTTP_IDEMPOTENCY_KEY="pos-1-0001")
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(
+            [p.quantity for p in Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by("name")],
+            [9, 8, 7],
+        )
+
+        # same key, different request
+        res = self.employee_client.post(
+            "/api/sales/", self.sale_payload([1], "INV-2"), format="json", HTTP_IDEMPOTENCY_KEY="pos-1-0001"
+        )
+        self.assertEqual(res.status_code, 422)
+        # keys are per user
+        res = self.owner_client.post("/api/sales/", self.sale_payload([1], "INV-2"), format="json",
+                                     HTTP_IDEMPOTENCY_KEY="pos-1-0001")
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertNotIn("Idempotent-Replayed", res)
+
+    def test_failed_request_releases_idempotency_key(self):
+        res = self.employee_client.post(
+            "/api/sales/", self.sale_payload([1, 11, 12]), format="json", HTTP_IDEMPOTENCY_KEY="pos-1-0002"
+        )
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        Product.objects.update(quantity=20)
+        res = self.employee_client.post(
+            "/api/sales/", self.sale_payload([1, 11, 12]), format="json", HTTP_IDEMPOTENCY_KEY="pos-1-0002"
+        )
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertNotIn("Idempotent-Replayed", res)
+
+    def test_idempotency_key_on_expenses_and_purge(self):
+        payload = {"title": "Rent", "amount": "150.00", "date": "2026-01-05"}
+        for _ in range(2):
+            res = self.owner_client.post("/api/expenses/", payload, format="json", HTTP_IDEMPOTENCY_KEY="exp-1")
+            self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(Expense.objects.count(), 1)
+        self.assertEqual(res["Idempotent-Replayed"], "true")
+        self.assertEqual(
+            self.owner_client.post("/api/expenses/", payload, format="json", HTTP_IDEMPOTENCY_KEY="").status_code, 400
+        )
+
+        IdempotencyKey.objects.update(created_at=datetime.now(dt_timezone.utc) - timedelta(days=2))
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertIn("Deleted 1", out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class ReportSummaryTests(ShopTestCase):
+    def add_sale(self, when, amount, profit, invoice):
+        sale = Sale.objects.create(
+            shop=self.shop, branch=self.branch, total_amount=amount, profit_amount=profit, invoice_number=invoice
+        )
+        Sale.objects.filter(pk=sale.pk).update(created_at=when)
+
+    def test_month_buckets_are_keyed_by_date(self):
+        self.add_sale(datetime(2025, 10, 20, 12, tzinfo=dt_timezone.utc), "100.00", "20.00", "INV-1")
+        self.add_sale(datetime(2026, 10, 2, 12, tzinfo=dt_timezone.utc), "50.00", "10.00", "INV-2")
+        self.add_sale(datetime(2026, 10, 3, 12, tzinfo=dt_timezone.utc), "25.00", "5.00", "INV-3")
+        Expense.objects.create(shop=self.shop, branch=self.branch, title="Rent", amount="30.00", date=date(2026, 10, 1))
+        rebuild_rollups(date(2025, 1, 1), date(2026, 12, 31))
+
+        with self.assertNumQueries(1):
+            data = report_summary(self.shop, None, date(2025, 10, 18), "month", end_date=date(2026, 10, 18))
+
+        self.assertEqual(len(data["chart_data"]), 13)
+        first, last = data["chart_data"][0], data["chart_data"][-1]
+        self.assertEqual((first["period"], first["revenue"], first["sales"]), ("2025-10-01", 100.0, 1))
+        self.assertEqual((last["period"], last["revenue"], last["expense"], last["sales"]), ("2026-10-01", 75.0, 30.0, 2))
+        self.assertEqual(data["total_revenue"], 175)
+        self.assertEqual(data["total_profit"], 35)
+        self.assertEqual(data["total_expense"], 30)
+        self.assertEqual(data["total_sales"], 3)
+
+    def test_day_buckets_fill_gaps(self):
+        self.add_sale(datetime(2026, 10, 2, 12, tzinfo=dt_timezone.utc), "50.00", "10.00", "INV-1")
+        rebuild_rollups(date(2026, 10, 1), date(2026, 10, 7))
+        data = report_summary(self.shop, self.branch, date(2026, 10, 1), "day", end_date=date(2026, 10, 7))
+        self.assertEqual([d["revenue"] for d in data["chart_data"]], [0, 50.0, 0, 0, 0, 0, 0])
+
+    def test_endpoint(self):
+        res = self.employee_client.get("/api/reports/summary/?timeframe=7days&granularity=day")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["granularity"], "day")
+        self.assertEqual(len(res.json()["chart_data"]), 8)
+
+    def test_cached_report_until_write(self):
+        url = "/api/reports/summary/?timeframe=7days&granularity=day"
+        self.assertEqual(self.employee_client.get(url).json()["total_sales"], 0)
+        with self.assertNumQueries(0):  # token and report both cached
+            self.assertEqual(self.employee_client.get(url).json()["total_sales"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.employee_client.post(
+                "/api/expenses/", {"title": "Rent", "amount": "30.00", "date": date.today().isoformat()}, format="json"
+            )
+        self.assertEqual(self.employee_client.get(url).json()["total_expense"], 30)
+        self.assertEqual(self.owner_client.get(url).json()["total_expense"], 30)
+
+
+class IndexCheckTests(TestCase):
+    def test_viewset_filters_are_indexed(self):
+        out = StringIO()
+        call_command("check_indexes", "--fail", stdout=out)
+        self.assertNotIn("MISSING", out.getvalue())
+
+    def test_reports_unindexed_filter(self):
+        self.assertIsNone(find_index(Customer, {"email": "a@example.com"}, []))
+        self.assertIsNone(find_index(Sale, {"shop_id": 1}, [("total_amount", True)]))
+        self.assertEqual(find_index(Sale, {"shop_id": 1}, [("created_at", True), ("id", True)]), "sale_shop_created_idx")
+        # the partial index only applies to pending sales
+        pending = find_index(Sale, {"shop_id": 1, "branch_id": 2, "status": "pending"}, [("created_at", True), ("id", True)])
+        self.assertEqual(pending, "sale_branch_pending_idx")
+        self.assertIsNone(
+            find_index(Sale, {"shop_id": 1, "branch_id": 2, "status": "completed"}, [("created_at", True), ("id", True)])
+        )
+
+
+class TimeOrderedIdTests(ShopTestCase):
+    def test_uuid7_is_increasing(self):
+        ids = [uuid7() for _ in range(5000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual({(i.version, i.variant) for i in ids}, {(7, uuid.RFC_4122)})
+
+    def test_new_sales_get_time_ordered_ids(self):
+        first = Sale.objects.create(shop=self.shop, branch=self.branch, total_amount=1, invoice_number="INV-1")
+        second = Sale.objects.create(shop=self.shop, branch=self.branch, total_amount=1, invoice_number="INV-2")
+        self.assertEqual(first.id.version, 7)
+        self.assertLess(first.id, second.id)
+        # rows created with uuid4 ids keep working next to the new ones
+        legacy = Sale.objects.create(id=uuid.uuid4(), shop=self.shop, total_amount=1, invoice_number="INV-0")
+        self.assertEqual(Sale.objects.filter(id__in=[first.id, legacy.id]).count(), 2)
+
+
+class CachedTokenAuthTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        local_tokens.clear()
+
+    def test_token_lookup_is_cached(self):
+        self.assertEqual(self.employee_client.get("/api/my-shop/").status_code, 200)
+        local_tokens.clear()  # the shared cache alone is enough
+        with self.assertNumQueries(0):
+            self.assertEqual(self.employee_client.get("/api/my-shop/").status_code, 200)
+
+    def test_logout_evicts_token(self):
+        self.assertEqual(self.employee_client.get("/api/my-shop/").status_code, 200)
+        self.assertEqual(self.employee_client.post("/auth/token/logout/").status_code, 204)
+        self.assertEqual(self.employee_client.get("/api/my-shop/").status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.employee_client.get("/api/my-shop/").status_code, 200)
+        self.employee.is_active = False
+        self.employee.save()
+        self.assertEqual(self.employee_client.get("/api/my-shop/").status_code, 401)
+
+
+class JWTAuthTests(ShopTestCase):
+    def obtain(self, username):
+        serializer = TenantTokenObtainPairSerializer(data={"username": username, "password": "pass12345"})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def authenticate(self, access):
+        request = APIRequestFactory().get("/api/my-shop/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        return TenantJWTAuthentication().authenticate(request)
+
+    def test_access_token_carries_tenant(self):
+        tokens = self.obtain("cashier")
+        with self.assertNumQueries(0):
+            user, token = self.authenticate(tokens["access"])
+            shop, branch, role = get_user_tenant(user)
+        self.assertEqual((user.pk, user.username), (self.employee.pk, "cashier"))
+        self.assertEqual((shop.pk, branch.pk, role), (self.shop.pk, self.branch.pk, "employee"))
+        # fields beyond the claims load on demand
+        self.assertEqual(shop.name, "Corner Shop")
+
+    def test_refresh_rotates_and_updates_claims(self):
+        tokens = self.obtain("cashier")
+        self.membership.delete()
+        refresh = TenantTokenRefreshSerializer(data={"refresh": tokens["refresh"]})
+        refresh.is_valid(raise_exception=True)
+        self.assertNotEqual(refresh.validated_data["refresh"], tokens["refresh"])
+        user, _ = self.authenticate(refresh.validated_data["access"])
+        self.assertEqual(get_user_tenant(user).shop, None)
+
+        # the rotated refresh token is blacklisted
+        with self.assertRaises(TokenError):
+            TenantTokenRefreshSerializer(data={"refresh": tokens["refresh"]}).is_valid()
+
+    def test_logout_revokes_tokens(self):
+        tokens = self.obtain("owner")
+        request = APIRequestFactory().post(
+            "/auth/jwt/logout/", {"refresh": tokens["refresh"]}, format="json",
+            HTTP_AUTHORIZATION=f"Bearer {tokens['access']}",
+        )
+        self.assertEqual(JWTLogoutView.as_view()(request).status_code, 204)
+        with self.assertRaises(InvalidToken):
+            self.authenticate(tokens["access"])
+        with self.assertRaises(TokenError):
+            TenantTokenRefreshSerializer(data={"refresh": tokens["refresh"]}).is_valid()
+
+
+class DatabaseConfigTests(TestCase):
+    env = {"DB_NAME": "shopmate", "DB_USER": "u", "DB_PASSWORD": "p", "DB_HOST": "db", "DB_PORT": "5432"}
+
+    def test_persistent_connections_by_default(self):
+        with mock.patch.dict(os.environ, self.env):
+            database = default_database()
+        self.assertEqual((database["CONN_MAX_AGE"], database["CONN_HEALTH_CHECKS"]), (60, True))
+        self.assertNotIn("OPTIONS", database)
+
+    def test_pool_is_split_across_workers(self):
+        env = dict(self.env, DB_POOL="True", DB_MAX_CONNECTIONS="200", DB_RESERVED_CONNECTIONS="16", WEB_WORKERS="8")
+        with mock.patch.dict(os.environ, env):
+            database = default_database()
+        self.assertEqual(database["CONN_MAX_AGE"], 0)
+        self.assertEqual((database["OPTIONS"]["pool"]["min_size"], database["OPTIONS"]["pool"]["max_size"]), (2, 23))
+
+    def test_pool_stats_endpoint_is_staff_only(self):
+        user = User.objects.create_user(username="ops", password="x")
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get("/internal/db-pool/").status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        data = client.get("/internal/db-pool/").json()
+        self.assertEqual(data["databases"]["default"]["vendor"], connection.vendor)
+        self.assertGreaterEqual(data["databases"]["default"]["opened"], 1)
+
+
+@mock.patch("core.db_router.replica_configured", return_value=True)
+class ReplicaRoutingTests(ShopTestCase):
+    def test_reads_use_replica_only_inside_block(self, _configured):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Sale))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Sale), "replica")
+            self.assertEqual(router.db_for_write(Sale), "default")
+            with replica_reads(False):
+                self.assertIsNone(router.db_for_read(Sale))
+        self.assertIsNone(router.db_for_read(Sale))
+        self.assertFalse(router.allow_migrate("replica", "core"))
+
+    def test_writes_pin_the_user_to_the_primary(self, _configured):
+        request = APIRequestFactory().get("/api/sales/")
+        request.user = self.employee
+        self.assertTrue(replica_allowed(request))
+
+        res = self.employee_client.post(
+            "/api/expenses/", {"title": "Rent", "amount": "30.00", "date": date.today().isoformat()}, format="json"
+        )
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(is_pinned("user", self.employee.pk))
+        self.assertFalse(replica_allowed(request))
+        self.assertFalse(is_pinned("user", self.owner.pk))
+
+    def test_report_stays_on_primary_after_shop_changes(self, _configured):
+        request = APIRequestFactory().get("/api/reports/summary/")
+        request.user = self.owner
+        self.assertTrue(ReportSummary().use_replica(request))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.employee_client.post(
+                "/api/expenses/", {"title": "Rent", "amount": "30.00", "date": date.today().isoformat()}, format="json"
+            )
+        self.assertTrue(is_pinned("shop", self.shop.pk))
+        self.assertFalse(ReportSummary().use_replica(request))
+
+
+@skipUnless("replica" in settings.DATABASES, "no replica database configured")
+class ReplicaReadTests(TransactionTestCase):
+    # the test replica mirrors the default database, so rows must be committed
+    databases = {"default", "replica"} if "replica" in settings.DATABASES else {"default"}
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username="owner", password="pass12345")
+        self.shop = Shop.objects.create(name="Corner Shop", owner=user)
+        self.branch = Branch.objects.create(shop=self.shop, branch_name="Main")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+
+    def test_lists_read_from_replica_until_a_write(self):
+        Product.objects.create(shop=self.shop, branch=self.branch, name="Tea", selling_price="2.50")
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            res = self.client.get("/api/products/")
+        self.assertEqual(len(res.json()["results"]), 1)
+        self.assertTrue(replica.captured_queries)
+
+        self.client.post("/api/expenses/", {"title": "Rent", "amount": "30.00", "date": date.today().isoformat()}, format="json")
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            self.assertEqual(len(self.client.get("/api/expenses/").json()["results"]), 1)
+        self.assertFalse(replica.captured_queries)
+
+
+class AsyncReportTests(TransactionTestCase):
+    # the dashboard queries from executor threads, which only see committed rows
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="pass12345")
+        self.shop = Shop.objects.create(name="Corner Shop", owner=self.owner)
+        self.branch = Branch.objects.create(shop=self.shop, branch_name="Main")
+        self.auth = {"Authorization": f"Token {Token.objects.create(user=self.owner).key}"}
+
+    async def test_async_report_matches_sync_report(self):
+        url = "?timeframe=7days&granularity=day"
+        res = await self.async_client.get("/api/async/reports/summary/" + url, headers=self.auth)
+        self.assertEqual(res.status_code, 200)
+        sync_res = await sync_to_async(self.client.get)("/api/reports/summary/" + url, headers=self.auth)
+        self.assertEqual(res.json(), sync_res.json())
+
+    async def test_dashboard_runs_every_aggregate(self):
+        def write():
+            Sale.objects.create(shop=self.shop, branch=self.branch, total_amount="50.00", invoice_number="INV-1")
+            Product.objects.create(shop=self.shop, branch=self.branch, name="Tea", selling_price="2.50", quantity=1)
+            Expense.objects.create(shop=self.shop, branch=self.branch, title="Rent", amount="30.00", date=date.today())
+            rebuild_rollups(date.today(), date.today())
+        await sync_to_async(write)()
+
+        res = await self.async_client.get("/api/async/dashboard/?timeframe=7days", headers=self.auth)
+        self.assertEqual(res.status_code, 200)
+        data = res.json()
+        self.assertEqual((data["pending_sales"], data["low_stock_products"]), (1, 1))
+        self.assertEqual(data["today"]["expense"], 30.0)
+        self.assertEqual(data["summary"]["total_expense"], 30)
+
+    async def test_requires_authentication(self):
+        res = await self.async_client.get("/api/async/dashboard/")
+        self.assertEqual(res.status_code, 401)
+        res = await self.async_client.post("/api/async/reports/summary/", headers=self.auth)
+        self.assertEqual(res.status_code, 405)
+
+
+@mock.patch("core.catalog.CATALOG_SYNC_OVERLAP", 0)
+class CatalogSyncTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(shop=self.shop, branch=self.branch, name="Drinks")
+        self.products = [
+            Product.objects.create(
+                shop=self.shop, branch=self.branch, category=self.category, name=f"Item {i}",
+                cost_price="5.00", selling_price="8.00", quantity=10,
+            )
+            for i in range(5)
+        ]
+
+    def sync(self, client, token=None, **params):
+        if token:
+            params["token"] = token
+        res = client.get("/api/products/sync/", params)
+        self.assertEqual(res.status_code, 200, res.content)
+        return res.json()
+
+    def test_full_then_delta(self):
+        self.employee_client.get("/api/customers/")  # warm the tenant/token lookups
+        with self.assertNumQueries(2):  # products, categories
+            first = self.sync(self.employee_client)
+        self.assertTrue(first["reset"])
+        self.assertFalse(first["more"])
+        self.assertEqual(len(first["products"]), 5)
+        self.assertEqual(first["products"][0]["category_id"], str(self.category.pk))
+        self.assertNotIn("category", first["products"][0])
+        self.assertEqual(first["categories"], [{"id": str(self.category.pk), "name": "Drinks"}])
+
+        with self.assertNumQueries(3):  # and tombstones
+            unchanged = self.sync(self.employee_client, first["token"])
+        self.assertEqual((unchanged["reset"], unchanged["products"], unchanged["deleted"]), (False, [], []))
+
+        self.products[0].selling_price = "9.00"
+        self.products[0].save()
+        self.assertEqual(self.employee_client.delete(f"/api/products/{self.products[1].pk}/").status_code, 204)
+        added = Product.objects.create(shop=self.shop, branch=self.branch, name="New", selling_price="1.00")
+        Product.objects.create(shop=self.shop, name="Other branch", selling_price="1.00")
+
+        delta = self.sync(self.employee_client, unchanged["token"])
+        self.assertEqual({p["id"] for p in delta["products"]}, {str(self.products[0].pk), str(added.pk)})
+        self.assertEqual(delta["deleted"], [str(self.products[1].pk)])
+        # the owner sees the whole shop
+        self.assertEqual(len(self.sync(self.owner_client, unchanged["token"])["products"]), 3)
+
+    def test_pages(self):
+        token, seen, pages = None, [], 0
+        while True:
+            page = self.sync(self.employee_client, token, limit=2)
+            seen += [p["id"] for p in page["products"]]
+            token, pages = page["token"], pages + 1
+            if not page["more"]:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(seen), sorted(str(p.pk) for p in self.products))
+
+    def test_pages_of_long_unchanged_products(self):
+        old = datetime.now(dt_timezone.utc) - timedelta(days=90)
+        for n, product in enumerate(self.products):
+            Product.objects.filter(pk=product.pk).update(updated_at=old + timedelta(seconds=n))
+
+        token, seen, resets = None, [], 0
+        for _ in range(len(self.products)):
+            page = self.sync(self.employee_client, token, limit=2)
+            seen += [p["id"] for p in page["products"]]
+            token, resets = page["token"], resets + page["reset"]
+            if not page["more"]:
+                break
+        self.assertFalse(page["more"])
+        self.assertEqual(resets, 1)
+        self.assertEqual(sorted(seen), sorted(str(p.pk) for p in self.products))
+
+    def test_bad_and_expired_tokens(self):
+        self.assertEqual(self.employee_client.get("/api/products/sync/", {"token": "nope"}).status_code, 400)
+        self.assertEqual(self.employee_client.get("/api/products/sync/", {"limit": "0"}).status_code, 400)
+
+        old = datetime.now(dt_timezone.utc) - timedelta(days=365)
+        Product.objects.filter(pk=self.products[0].pk).delete()
+        stale = self.sync(self.employee_client, encode_token((old, None), (old, None)))
+        self.assertTrue(stale["reset"])
+        self.assertEqual((len(stale["products"]), stale["deleted"]), (4, []))
+
+        ProductTombstone.objects.update(deleted_at=old)
+        out = StringIO()
+        call_command("purge_catalog_tombstones", stdout=out)
+        self.assertIn("Deleted 1", out.getvalue())
+
+
+class ConditionalGetTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(shop=self.shop, branch=self.branch, name="Drinks")
+        self.product = Product.objects.create(
+            shop=self.shop, branch=self.branch, category=self.category, name="Cola", selling_price="2.00", quantity=10,
+        )
+        self.customer = Customer.objects.create(shop=self.shop, branch=self.branch, full_name="Walk-in")
+
+    def poll(self, path, etag=None, client=None, **params):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return (client or self.employee_client).get(path, params, **headers)
+
+    def test_unchanged_poll_is_not_modified(self):
+        for path in ("/api/products/", "/api/categories/", "/api/customers/", "/api/my-shop/"):
+            first = self.poll(path)
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(first["Cache-Control"], "private, no-cache")
+            with self.assertNumQueries(0):
+                again = self.poll(path, first["ETag"])
+            self.assertEqual(again.status_code, 304, path)
+            self.assertEqual(again["ETag"], first["ETag"])
+            self.assertEqual(again.content, b"")
+
+        etag = self.poll("/api/products/")["ETag"]
+        self.assertEqual(self.poll("/api/products/", etag, page_size=1).status_code, 200)
+        self.assertEqual(self.poll("/api/products/", etag, client=self.owner_client).status_code, 200)
+        self.assertEqual(self.poll("/api/products/", f'"other", {etag}').status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        def changes(path, write):
+            etag = self.poll(path)["ETag"]
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            res = self.poll(path, etag)
+            self.assertEqual(res.status_code, 200, path)
+            self.assertNotEqual(res["ETag"], etag)
+
+        changes("/api/products/", lambda: self.employee_client.patch(
+            f"/api/products/{self.product.pk}/", {"selling_price": "2.50"}, format="json"))
+        # stock moves with an UPDATE, without model signals
+        changes("/api/products/", lambda: self.employee_client.post("/api/sales/", {
+            "customer_id": str(self.customer.pk), "total_amount": "2.50", "invoice_number": "INV-1",
+            "sale_items": [{"product_id": str(self.product.pk), "quantity": 1, "unit_price": "2.50",
+                            "unit_cost": "1.00", "total_price": "2.50", "total_cost": "1.00"}],
+        }, format="json"))
+        # products render their category
+        changes("/api/products/", lambda: Category.objects.filter(pk=self.category.pk).get().save())
+        changes("/api/categories/", lambda: Category.objects.create(shop=self.shop, branch=self.branch, name="Food"))
+        changes("/api/customers/", lambda: self.employee_client.post(
+            "/api/customers/", {"full_name": "Ada", "phone": "123"}, format="json"))
+        changes("/api/my-shop/", lambda: Shop.objects.filter(pk=self.shop.pk).get().save())
+
+        # other shops' writes leave it alone
+        other = Shop.objects.create(name="Other", owner=User.objects.create_user(username="other", password="x"))
+        etag = self.poll("/api/customers/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(shop=other, full_name="Elsewhere")
+        self.assertEqual(self.poll("/api/customers/", etag).status_code, 304)
+
+
+class JobQueueTests(ShopTestCase):
+    def test_report_job_runs_in_worker(self):
+        res = self.employee_client.post(
+            "/api/jobs/", {"name": "report", "payload": {"timeframe": "7days", "granularity": "day"}}, format="json"
+        )
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(res.json()["status"], "queued")
+
+        call_command("run_workers", "--once", stdout=StringIO())
+        job = self.employee_client.get(f"/api/jobs/{res.json()['id']}/").json()
+        self.assertEqual((job["status"], job["attempts"]), ("succeeded", 1))
+        self.assertEqual(len(job["result"]["chart_data"]), 8)
+        self.assertIsNotNone(job["run_ms"])
+
+        metrics = self.owner_client.get("/api/jobs/metrics/").json()["jobs"]["report"]
+        self.assertEqual(metrics["counts"], {"succeeded": 1})
+        self.assertIn("p95", metrics["run_ms"])
+
+    def test_job_types_check_role_and_payload(self):
+        payload = {"start": "2026-01-01", "end": "2026-01-31"}
+        res = self.employee_client.post("/api/jobs/", {"name": "rebuild_rollups", "payload": payload}, format="json")
+        self.assertEqual(res.status_code, 400)
+        res = self.owner_client.post(
+            "/api/jobs/", {"name": "rebuild_rollups", "payload": {"start": "2026-02-01", "end": "2026-01-01"}},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 400)
+        res = self.owner_client.post("/api/jobs/", {"name": "rebuild_rollups", "payload": payload}, format="json")
+        self.assertEqual(res.status_code, 202)
+        # the owner's job is not listed for the employee
+        self.assertEqual(self.employee_client.get("/api/jobs/").json()["results"], [])
+
+    def test_failed_job_is_retried_with_backoff(self):
+        flaky = mock.Mock(side_effect=ValueError("boom"))
+        with mock.patch.dict(registry, {"flaky": registry["report"]._replace(func=flaky, max_attempts=2)}):
+            job = enqueue("flaky", shop=self.shop)
+            with self.assertLogs("core.jobs", "WARNING"):
+                self.assertEqual(run_due_jobs("test"), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ("queued", 1))
+            self.assertIn("boom", job.error)
+            self.assertGreater(job.run_at, job.created_at)
+            self.assertEqual(run_due_jobs("test"), 0)  # not due yet
+
+            Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+            with self.assertLogs("core.jobs", "ERROR"):
+                self.assertEqual(run_due_jobs("test"), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ("failed", 2))
+
+    def test_jobs_are_claimed_once_and_stale_ones_requeued(self):
+        job = enqueue("report", {"timeframe": "7days", "granularity": "day"}, shop=self.shop)
+        self.assertEqual([j.pk for j in claim_jobs("worker-a")], [job.pk])
+        self.assertEqual(claim_jobs("worker-b"), [])
+
+        self.assertEqual(requeue_stale_jobs(timeout=60), (0, 0))
+        Job.objects.filter(pk=job.pk).update(locked_at=job.created_at - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(timeout=60), (1, 0))
+        [second] = claim_jobs("worker-b")
+        self.assertEqual(second.attempts, 2)
+
+        # worker-a finishing late must not overwrite worker-b's run
+        job.refresh_from_db()
+        job.locked_by, job.locked_at = "worker-a", job.created_at - timedelta(hours=1)
+        self.assertFalse(run_job(job))
+        self.assertEqual(Job.objects.get(pk=job.pk).locked_by, "worker-b")
+        self.assertTrue(run_job(second))
+        self.assertEqual(Job.objects.get(pk=job.pk).status, "succeeded")
+
+    def test_jobs_are_claimed_as_they_start(self):
+        jobs = [enqueue("report", {"timeframe": "7days", "granularity": "day"}, shop=self.shop) for _ in range(3)]
+        with mock.patch("core.jobs.claim_jobs", wraps=claim_jobs) as claim:
+            self.assertEqual(run_due_jobs("test", limit=10), 3)
+        self.assertEqual([c.args[1] for c in claim.call_args_list], [1, 1, 1, 1])
+        self.assertEqual(set(Job.objects.filter(pk__in=[j.pk for j in jobs]).values_list("status", flat=True)),
+                         {"succeeded"})
@@ -13,6 +13,7 @@ from .views import (
     SaleItemViewSet,
     InvoiceViewSet,
     ExpenseViewSet,
+    JobViewSet,
     ReportSummary,
     shop_search,
     join_shop,
@@ -23,6 +24,7 @@ from .views import (
     my_shop,
     shop_branches
 )
+from .async_views import dashboard_view, report_summary_view
 
 router = DefaultRouter()
 router.register(r'profiles', ProfileViewSet)
@@ -36,11 +38,14 @@ router.register(r'sale-items', SaleItemViewSet, basename='saleitem')
 router.register(r'invoices', InvoiceViewSet,basename='invoice')
 router.register(r'expenses', ExpenseViewSet, basename='expense') 
 router.register(r'shopmembership', ShopMembershipViewSet,basename='shopmembership')
+router.register(r'jobs', JobViewSet, basename='job')
 
 urlpatterns = [
     path('', home,name='home'), 
     path('api/', include(router.urls)),
     path('api/reports/summary/', ReportSummary.as_view(), name="report-summary"),
+    path('api/async/reports/summary/', report_summary_view, name="async-report-summary"),  # ASGI
+    path('api/async/dashboard/', dashboard_view, name="async-dashboard"),  # ASGI
     path("api/my-shop/", my_shop, name="my-shop"),
     path("api/shop_search/", shop_search, name="shop-search"),
     path("api/join_shop/", join_shop, name="join-shop"),
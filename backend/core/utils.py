@@ -1,15 +1,66 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
 from .models import *
 
-def get_user_shop_and_branch(user):
+# shop/branch/role the current user works under; role is "owner", "employee" or None
+Tenant = namedtuple("Tenant", ["shop", "branch", "role"])
+
+NO_TENANT = Tenant(None, None, None)
+TENANT_CACHE_TIMEOUT = getattr(settings, "TENANT_CACHE_TIMEOUT", 300)
+
+
+def tenant_cache_key(user_id):
+    return f"core:tenant:{user_id}"
+
+
+def resolve_user_tenant(user):
     # Owner → no branch restriction
     shop = Shop.objects.filter(owner=user).first()
-    branch = None
+    if shop:
+        return Tenant(shop, None, "owner")
+
+    membership = ShopMembership.objects.filter(user=user, status="approved").select_related("branch", "shop").first()
+    if membership:
+        return Tenant(membership.shop, membership.branch, membership.role)
 
-    if not shop:
-        membership = ShopMembership.objects.filter(user=user, status="approved").select_related("branch", "shop").first()
-        if membership:
-            shop = membership.shop
-            branch = membership.branch
+    return NO_TENANT
 
-    return shop, branch
 
+def get_user_tenant(user):
+    """
+    Cached tenant lookup, invalidated by the Shop/Branch/ShopMembership signals.
+    """
+    if user is None or not user.is_authenticated:
+        return NO_TENANT
+
+    # JWT users carry their tenant in the access token (core.authentication)
+    tenant = getattr(user, "jwt_tenant", None)
+    if tenant is not None:
+        return tenant
+
+    key = tenant_cache_key(user.pk)
+    tenant = cache.get(key)
+    if tenant is None:
+        tenant = resolve_user_tenant(user)
+        cache.set(key, tenant, TENANT_CACHE_TIMEOUT)
+    return tenant
+
+
+def get_request_tenant(request):
+    # TenantMiddleware resolves this once per request; fall back if it isn't installed
+    tenant = getattr(request, "tenant", None)
+    if tenant is None:
+        tenant = get_user_tenant(request.user)
+    return tenant
+
+
+def invalidate_user_tenants(user_ids):
+    cache.delete_many([tenant_cache_key(user_id) for user_id in user_ids])
+
+
+def get_user_shop_and_branch(user):
+    tenant = get_user_tenant(user)
+    return tenant.shop, tenant.branch
@@ -1,18 +1,33 @@
-from rest_framework import viewsets, permissions, status,generics
+import uuid
+from collections import Counter
+
+from rest_framework import viewsets, permissions, status,generics, mixins
 from .models import *
 from .serializers import *
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
-from .utils import get_user_shop_and_branch
+from .utils import get_request_tenant
+from .authentication import TenantJWTAuthentication, TenantRefreshToken, revoke_access_token
+from .stock import reserve_stock
+from .sales import MAX_CONFIRM_BATCH, MAX_SYNC_BATCH, confirm_sales, sync_sales
+from .rollups import apply_rollup_delta, expense_rollup, sale_rollup
+from .reports import cached_report_summary, report_params
+from .pagination import CreatedAtCursorPagination, ExpenseCursorPagination
+from .eager_loading import EagerLoadingMixin
+from .db_pool import pool_stats
+from .catalog import CATALOG_SYNC_MAX_PAGE_SIZE, CATALOG_SYNC_PAGE_SIZE, InvalidSyncToken, catalog_changes
+from .db_router import ReplicaReadsMixin, replica_allowed
+from .etags import ConditionalListMixin, collection_etag, not_modified, tag_response
+from .idempotency import IdempotentCreateMixin
+from .jobs import enqueue, job_metrics
 from rest_framework.decorators import api_view,action,permission_classes
 from django.db.models import Q
-
-from collections import defaultdict
+from django.utils import timezone
 from datetime import timedelta
-from django.utils.timezone import now
-from django.db.models import Sum
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
 
 
 def home(request):
@@ -20,29 +35,29 @@ def home(request):
 
 @api_view(['GET'])
 def my_shop(request):
-    # Get the first shop for the logged-in user
-    shop = Shop.objects.filter(owner=request.user).first()
-
-    # If not owner, check if employee of any approved shop
-    if not shop:
-        membership = ShopMembership.objects.filter(
-            user=request.user,
-            status="approved"
-        ).first()
-        if membership:
-            shop = membership.shop
+    # Shop the user owns, or the approved shop they work in
+    tenant = get_request_tenant(request)
+    shop = tenant.shop
 
     if not shop:
         return Response({"detail": "No shop found"}, status=404)
 
+    etag = collection_etag(request, tenant, ["shop"])
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+
+    if shop.get_deferred_fields():
+        # only the id came from the JWT claims
+        shop = Shop.objects.get(pk=shop.pk)
     serializer = ShopSerializer(shop)
-    return Response(serializer.data)
+    return tag_response(Response(serializer.data), etag)
 
 class ProfileViewSet(viewsets.ModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
 
-class ShopViewSet(viewsets.ModelViewSet):
+class ShopViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ShopSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -63,9 +78,10 @@ class ShopViewSet(viewsets.ModelViewSet):
             return Response(ShopSerializer(shop).data, status=200)
         return Response({"detail": "No shop found"}, status=404)
 
-class ShopMembershipViewSet(viewsets.ModelViewSet):
+class ShopMembershipViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ShopMembershipSerializer
     permission_classes = [permissions.IsAuthenticated]
+    eager_select_related = ("branch__shop",)  # Branch.__str__ reads the shop name
 
     def get_queryset(self):
         # Users only see memberships where they are the user
@@ -80,7 +96,9 @@ class PendingJoinRequestsView(APIView):
 
     def get(self, request):
         owner_shops = Shop.objects.filter(owner=request.user)
-        requests = ShopMembership.objects.filter(shop__in=owner_shops, status="pending")
+        requests = ShopMembership.objects.filter(
+            shop__in=owner_shops, status="pending"
+        ).select_related("user__profile", "shop")
 
         data = [
             {
@@ -184,7 +202,7 @@ class EmployeeListView(APIView):
         if owner_shops.exists():
             employees = ShopMembership.objects.filter(
                 shop__in=owner_shops, status="approved"
-            ).select_related("user", "shop", "branch")
+            ).select_related("user__profile", "shop", "branch")
         else:
             # If the user is an employee → restrict to their branch only
             membership = ShopMembership.objects.filter(
@@ -197,7 +215,7 @@ class EmployeeListView(APIView):
             if membership.branch:
                 employees = ShopMembership.objects.filter(
                     branch=membership.branch, status="approved"
-                ).select_related("user", "shop", "branch")
+                ).select_related("user__profile", "shop", "branch")
             else:
                 # fallback: no branch assigned → see nobody
                 employees = ShopMembership.objects.none()
@@ -275,12 +293,14 @@ def shop_branches(request):
     data = [{"id": str(b.id), "name": b.branch_name} for b in branches]
     return Response(data)
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(ConditionalListMixin, ReplicaReadsMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = CustomerSerializer
+    etag_collections = ("customers",)
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         if not shop:
             return Customer.objects.none()
 
@@ -290,16 +310,17 @@ class CustomerViewSet(viewsets.ModelViewSet):
         return qs
 
     def perform_create(self, serializer):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         serializer.save(shop=shop, branch=branch)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = CategorySerializer
+    etag_collections = ("categories",)
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         if not shop:
             return Category.objects.none()
 
@@ -309,15 +330,17 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return qs
 
     def perform_create(self, serializer):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         serializer.save(shop=shop, branch=branch)
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalListMixin, ReplicaReadsMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ProductSerializer
+    etag_collections = ("products", "categories")  # products render their nested category
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         if not shop:
             return Product.objects.none()
 
@@ -329,16 +352,52 @@ class ProductViewSet(viewsets.ModelViewSet):
         return qs
 
     def perform_create(self, serializer):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         serializer.save(shop=shop, branch=branch)
 
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        """
+        GET ?token=&limit=: catalog delta sync for POS terminals (core/catalog.py).
+        Compact products changed since the token, ids of deleted products, the
+        categories, and the token to send next time. Call again while "more".
+        """
+        shop, branch, _ = get_request_tenant(request)
+        if not shop:
+            return Response({"detail": "No shop found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = int(request.query_params.get("limit", CATALOG_SYNC_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= CATALOG_SYNC_MAX_PAGE_SIZE:
+            return Response(
+                {"error": f"limit must be between 1 and {CATALOG_SYNC_MAX_PAGE_SIZE}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            changes = catalog_changes(self.get_queryset(), shop, branch, request.query_params.get("token"), limit)
+        except InvalidSyncToken as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        categories = Category.objects.filter(shop=shop)
+        if branch:
+            categories = categories.filter(branch=branch)
+        changes["products"] = ProductSyncSerializer(
+            changes["products"], many=True, context=self.get_serializer_context()
+        ).data
+        # a handful of rows without change tracking, so always sent in full
+        changes["categories"] = list(categories.values("id", "name"))
+        return Response(changes)
+
 
-class SaleViewSet(viewsets.ModelViewSet):
+class SaleViewSet(IdempotentCreateMixin, ReplicaReadsMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = SaleSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         if not shop:
             return Sale.objects.none()
 
@@ -352,145 +411,230 @@ class SaleViewSet(viewsets.ModelViewSet):
         return qs
 
     def perform_create(self, serializer):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
 
         with transaction.atomic():
+            # lock + decrement every product in the basket before writing the sale
+            reserve_stock(serializer.validated_data.get("sale_items", []), shop.pk)
             sale = serializer.save(shop=shop, branch=branch, employee=self.request.user)
+            apply_rollup_delta({}, sale_rollup(sale, sale.sale_items.all()))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            rollup_before = sale_rollup(instance, instance.sale_items.all())
+            instance.delete()
+            apply_rollup_delta(rollup_before, {})
+
 
-            for item in sale.sale_items.all():
-                product = item.product
-                if product.quantity < item.quantity:
-                     raise serializers.ValidationError(
-                       {"error": f"Not enough stock for {product.name}. Available: {product.quantity}"}
-                    )
-                product.quantity -= item.quantity
-                product.save() 
-                
     @action(detail=True, methods=["post"])
     def confirm(self, request, pk=None):
-        sale = self.get_object()
-        total_amount = request.data.get("total_amount")
-        profit_amount = request.data.get("profit_amount")
+        """
+        Completes a pending sale. Total and profit are computed from its items;
+        any totals in the body are ignored.
+        """
+        try:
+            pk = uuid.UUID(str(pk))
+        except ValueError:
+            raise Http404  # as get_object() would, instead of a ValidationError from the filter
+        confirmed = confirm_sales(self.get_queryset().filter(pk=pk))
+        if not confirmed:
+            self.get_object()  # 404 unless the sale exists in this shop/branch
+            return Response({"error": "Cancelled sales cannot be confirmed."}, status=status.HTTP_400_BAD_REQUEST)
+
+        sale = confirmed[0]
+        return Response({
+            "status": "success",
+            "message": "Sale confirmed and totals updated",
+            "total_amount": f"{sale.total_amount:.2f}",
+            "profit_amount": f"{sale.profit_amount:.2f}"
+        }, status=status.HTTP_200_OK)
 
-        # Validate data
-        if total_amount is None or profit_amount is None:
-            return Response(
-                {"error": "Both total_amount and profit_amount are required."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    @action(detail=False, methods=["post"], url_path="confirm")
+    def confirm_batch(self, request):
+        """
+        POST {"ids": [...]}: confirms many sales at once, with the same
+        server-side totals as the single confirm. Cancelled and unknown ids are
+        returned as skipped.
+        """
+        ids = request.data.get("ids")
+        if not isinstance(ids, list) or not ids:
+            return Response({"error": "ids must be a non-empty list of sale ids."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_CONFIRM_BATCH:
+            return Response({"error": f"At most {MAX_CONFIRM_BATCH} sales per call."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = {uuid.UUID(str(sale_id)) for sale_id in ids}
+        except ValueError:
+            return Response({"error": "ids must be sale ids."}, status=status.HTTP_400_BAD_REQUEST)
+
+        confirmed = confirm_sales(self.get_queryset().filter(pk__in=ids))
+        confirmed_ids = {sale.pk for sale in confirmed}
+        return Response({
+            "confirmed": [
+                {"id": str(sale.pk), "total_amount": f"{sale.total_amount:.2f}", "profit_amount": f"{sale.profit_amount:.2f}"}
+                for sale in confirmed
+            ],
+            "skipped": sorted(str(sale_id) for sale_id in ids - confirmed_ids),
+        }, status=status.HTTP_200_OK)
 
-        # Save the updated data
-        sale.total_amount = total_amount
-        sale.profit_amount = profit_amount
-        sale.status = "completed"
-        sale.save()
+    @action(detail=False, methods=["post"])
+    def sync(self, request):
+        """
+        POST {"sales": [...]}: sales a POS queued while offline, each with its
+        own id, invoice number and, optionally, the created_at it was made at;
+        totals are computed from the items. Returns
+        a result per sale (created, exists or rejected) and the counts.
+        """
+        sales = request.data.get("sales")
+        if not isinstance(sales, list) or not sales:
+            return Response({"error": "sales must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(sales) > MAX_SYNC_BATCH:
+            return Response({"error": f"At most {MAX_SYNC_BATCH} sales per call."}, status=status.HTTP_400_BAD_REQUEST)
+        shop, branch, _ = get_request_tenant(request)
+        if not shop:
+            return Response({"detail": "No shop found"}, status=status.HTTP_404_NOT_FOUND)
 
+        results = sync_sales(sales, request, shop, branch)
+        counts = Counter(result["status"] for result in results)
         return Response({
-            "status": "success",
-            "message": "Sale confirmed and totals updated",
-            "total_amount": sale.total_amount,
-            "profit_amount": sale.profit_amount
+            "created": counts["created"],
+            "exists": counts["exists"],
+            "rejected": counts["rejected"],
+            "results": results,
         }, status=status.HTTP_200_OK)
 
-class SaleItemViewSet(viewsets.ModelViewSet):
+class SaleItemViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = SaleItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         if not shop:
             return SaleItem.objects.none()
 
-        qs = SaleItem.objects.filter(shop=shop)
+        qs = SaleItem.objects.filter(sale__shop=shop)
         if branch:
-            qs = qs.filter(branch=branch)
+            qs = qs.filter(sale__branch=branch)
         return qs
 
     def perform_create(self, serializer):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         serializer.save(shop=shop, branch=branch)
 
 class InvoiceViewSet(viewsets.ModelViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(IdempotentCreateMixin, ReplicaReadsMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ExpenseCursorPagination
 
     def get_queryset(self):
-        shop, branch = get_user_shop_and_branch(self.request.user)
+        shop, branch, _ = get_request_tenant(self.request)
         if not shop:
             return Expense.objects.none()
 
-        qs = Expense.objects.filter(shop=shop).order_by('-date', '-created_at')
+        qs = Expense.objects.filter(shop=shop)
         if branch:
             qs = qs.filter(branch=branch)
         return qs
 
     def perform_create(self, serializer):
-        shop, branch = get_user_shop_and_branch(self.request.user)
-        serializer.save(shop=shop, branch=branch)
+        shop, branch, _ = get_request_tenant(self.request)
+        with transaction.atomic():
+            expense = serializer.save(shop=shop, branch=branch)
+            apply_rollup_delta({}, expense_rollup(expense))
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            rollup_before = expense_rollup(serializer.instance)
+            expense = serializer.save()
+            apply_rollup_delta(rollup_before, expense_rollup(expense))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            rollup_before = expense_rollup(instance)
+            instance.delete()
+            apply_rollup_delta(rollup_before, {})
 
-class ReportSummary(APIView):
+class JobViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Background jobs of the shop: owners see all of them, employees the ones
+    they queued. POST {"name": ..., "payload": {...}} queues a job and answers
+    202; poll the job until its status is succeeded or failed.
+    """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+
+    def get_serializer_class(self):
+        return JobCreateSerializer if self.action == "create" else JobSerializer
+
+    def get_queryset(self):
+        shop, _, role = get_request_tenant(self.request)
+        if not shop:
+            return Job.objects.none()
+
+        qs = Job.objects.filter(shop=shop)
+        if role != "owner":
+            qs = qs.filter(created_by=self.request.user)
+        return qs
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        shop, branch, _ = get_request_tenant(request)
+        if not shop:
+            return Response({"detail": "No shop found"}, status=status.HTTP_404_NOT_FOUND)
+        job = enqueue(serializer.validated_data["name"], serializer.validated_data["payload"], shop, branch, request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False)
+    def metrics(self, request):
+        # per job type: counts by status and wait/run time percentiles over the last ?hours=
+        try:
+            hours = max(1, int(request.query_params.get("hours", 24)))
+        except ValueError:
+            return Response({"error": "hours must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        since = timezone.now() - timedelta(hours=hours)
+        return Response({"hours": hours, "jobs": job_metrics(self.get_queryset().filter(created_at__gte=since))})
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def db_pool_stats(request):
+    # internal: connection/pool usage of the worker that served the request
+    return Response(pool_stats())
+
+class ReportSummary(ReplicaReadsMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def use_replica(self, request):
+        return replica_allowed(request, get_request_tenant(request).shop)
 
     def get(self, request, *args, **kwargs):
-        shop, branch = get_user_shop_and_branch(request.user)
+        shop, branch, _ = get_request_tenant(request)
         if not shop:
             return Response({"detail": "No shop found"}, status=status.HTTP_404_NOT_FOUND)
 
-        timeframe = request.query_params.get("timeframe", "30days")
+        timeframe, granularity = report_params(request.query_params)
+        return Response(cached_report_summary(shop, branch, timeframe, granularity), status=status.HTTP_200_OK)
 
-        if timeframe == "7days":
-            start_date = now().date() - timedelta(days=7)
-        elif timeframe == "3months":
-            start_date = now().date() - timedelta(days=90)
-        elif timeframe == "12months":
-            start_date = now().date() - timedelta(days=365)
-        else:
-            start_date = now().date() - timedelta(days=30)
+class JWTLogoutView(APIView):
+    """
+    POST {"refresh": "..."}: blacklists the refresh token and revokes the access
+    token the request was made with (AUTH_MODE=jwt).
+    """
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [permissions.AllowAny]
 
-        sales = Sale.objects.filter(shop=shop, created_at__date__gte=start_date)
-        expenses = Expense.objects.filter(shop=shop, date__gte=start_date)
+    def post(self, request):
+        refresh = request.data.get("refresh")
+        if not refresh:
+            return Response({"error": "refresh is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            TenantRefreshToken(refresh).blacklist()
+        except TokenError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if branch:
-            sales = sales.filter(branch=branch)
-            expenses = expenses.filter(branch=branch)
-
-        total_revenue = sales.aggregate(total=Sum("total_amount"))["total"] or 0
-        total_profit = sales.aggregate(total=Sum("profit_amount"))["total"] or 0
-        total_expense = expenses.aggregate(total=Sum("amount"))["total"] or 0
-        total_sales_count = sales.count()
-        chart_map = defaultdict(lambda: {"revenue": 0, "expense": 0})
-        month_order = []
-
-        for s in sales:
-            m = s.created_at.strftime("%b")
-            if m not in chart_map:
-                month_order.append(m)
-            chart_map[m]["revenue"] += float(s.total_amount)
-
-        for e in expenses:
-            m = e.date.strftime("%b")
-            if m not in chart_map:
-                month_order.append(m)
-            chart_map[m]["expense"] += float(e.amount)
-
-        chart_list = []
-        seen = set()
-        for m in month_order:
-            if m in seen:
-                continue
-            seen.add(m)
-            d = chart_map[m]
-            chart_list.append({"month": m, "revenue": d["revenue"], "expense": d["expense"]})
-        
-        data = {
-            "total_revenue": total_revenue,
-            "total_expense": total_expense,
-            "total_profit": total_profit,
-            "total_sales": total_sales_count,
-            "chart_data": chart_list,
-        }
-        return Response(data, status=status.HTTP_200_OK)
+        if isinstance(request.auth, AccessToken):
+            revoke_access_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
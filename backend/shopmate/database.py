@@ -0,0 +1,66 @@
+"""
+DATABASES['default'] for Postgres, built from the environment.
+
+Without DB_POOL, each worker thread keeps its connection for DB_CONN_MAX_AGE
+seconds and checks it before reuse (CONN_HEALTH_CHECKS) instead of connecting
+on every request.
+
+With DB_POOL=True, every worker process owns a psycopg 3 pool (psycopg[pool])
+of DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE connections, checked on checkout. Unless
+DB_POOL_MAX_SIZE is set, the server's DB_MAX_CONNECTIONS minus
+DB_RESERVED_CONNECTIONS (admin, migrations, cron) is split across WEB_WORKERS
+processes, so all workers together stay under Postgres max_connections.
+"""
+from decouple import config
+
+
+def pool_max_size():
+    size = config('DB_POOL_MAX_SIZE', default=0, cast=int)
+    if size:
+        return size
+    budget = config('DB_MAX_CONNECTIONS', default=100, cast=int) - config('DB_RESERVED_CONNECTIONS', default=10, cast=int)
+    return max(2, budget // max(1, config('WEB_WORKERS', default=4, cast=int)))
+
+
+def default_database():
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': config('DB_NAME'),
+        'USER': config('DB_USER'),
+        'PASSWORD': config('DB_PASSWORD'),
+        'HOST': config('DB_HOST'),
+        'PORT': config('DB_PORT'),
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if config('DB_POOL', default=False, cast=bool):
+        max_size = pool_max_size()
+        # the pool decides how long connections live; Django refuses CONN_MAX_AGE with it
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS'] = {
+            'pool': {
+                'min_size': min(config('DB_POOL_MIN_SIZE', default=2, cast=int), max_size),
+                'max_size': max_size,
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),  # wait for a free connection
+                'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+                'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=3600, cast=float),
+            },
+        }
+    return database
+
+
+def replica_database():
+    """
+    Read replica of the default database when DB_REPLICA_HOST is set: same
+    credentials and pooling, different host. Tests mirror it to the default
+    test database.
+    """
+    host = config('DB_REPLICA_HOST', default='')
+    if not host:
+        return None
+    database = default_database()
+    database['HOST'] = host
+    database['PORT'] = config('DB_REPLICA_PORT', default=database['PORT'])
+    database['NAME'] = config('DB_REPLICA_NAME', default=database['NAME'])
+    database['TEST'] = {'MIRROR': 'default'}
+    return database
@@ -10,8 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+from datetime import timedelta
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from decouple import config
+
+from .database import default_database, replica_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'core',
     'djoser',
@@ -52,10 +58,15 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.TenantMiddleware',
+    'core.middleware.PrimaryStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 CORS_ALLOW_ALL_ORIGINS = True 
+# POS clients send Idempotency-Key on POSTs (core/idempotency.py) and read whether the response was replayed
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 ROOT_URLCONF = 'shopmate.urls'
 
@@ -77,15 +88,32 @@ TEMPLATES = [
 WSGI_APPLICATION = 'shopmate.wsgi.application'
 
 SITE_ID = 1
+# "token": djoser auth tokens; "jwt": also accept stateless JWTs carrying the shop/branch/role claims
+AUTH_MODE = config('AUTH_MODE', default='token')
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",  # for Token
-        # "rest_framework_simplejwt.authentication.JWTAuthentication",  # for JWT
+        ("core.authentication.TenantJWTAuthentication",) if AUTH_MODE == 'jwt' else ()  # for JWT
+    ) + (
+        "core.authentication.CachedTokenAuthentication",  # for Token, cached per process and in CACHES
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
 }
+# cursor pagination for sales/products/customers/expenses (?page_size= up to the max)
+API_PAGE_SIZE = config('API_PAGE_SIZE', default=50, cast=int)
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=500, cast=int)
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=config('JWT_ACCESS_MINUTES', default=5, cast=int)),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=config('JWT_REFRESH_DAYS', default=7, cast=int)),
+    "ROTATE_REFRESH_TOKENS": True,
+    "BLACKLIST_AFTER_ROTATION": True,
+    "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "core.serializers.TenantTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "core.serializers.TenantTokenRefreshSerializer",
+}
 
 DJOSER = {
     "USER_CREATE_PASSWORD_RETYPE": False,
@@ -101,15 +129,42 @@ DJOSER = {
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
  
 DATABASES = {
+    'default': default_database(),  # persistent or pooled connections, see shopmate/database.py
+}
+if replica_database():
+    DATABASES['replica'] = replica_database()
+# read-only views opt in to the replica (core.db_router.ReplicaReadsMixin / read_from_replica)
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# seconds a user's (and after a report-changing write, a shop's) reads stay on the primary
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+# Cache
+# LocMemCache is per process; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) when running several workers.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': config('DB_NAME'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST'),
-        'PORT': config('DB_PORT'),
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='shopmate'),
     }
 }
+REPORT_CACHE_ALIAS = 'default'
+REPORT_CACHE_TIMEOUT = config('REPORT_CACHE_TIMEOUT', default=300, cast=int)
+# token -> user cache of core.authentication; the per-process copy is not evicted on logout in other workers
+TOKEN_CACHE_TIMEOUT = config('TOKEN_CACHE_TIMEOUT', default=300, cast=int)
+TOKEN_LOCAL_CACHE_TIMEOUT = config('TOKEN_LOCAL_CACHE_TIMEOUT', default=10, cast=int)
+
+# background jobs (core/jobs.py, manage.py run_workers)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=3, cast=int)
+JOB_RETRY_BACKOFF = config('JOB_RETRY_BACKOFF', default=10, cast=int)  # seconds before the first retry, doubling after
+JOB_RETRY_BACKOFF_MAX = config('JOB_RETRY_BACKOFF_MAX', default=3600, cast=int)
+JOB_TIMEOUT = config('JOB_TIMEOUT', default=600, cast=int)  # a running job is requeued after this; keep above the longest job
+
+# seconds a stored Idempotency-Key response is replayed; manage.py purge_idempotency_keys deletes older ones
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+
+# product catalog delta sync (core/catalog.py); purge_catalog_tombstones deletes tombstones older than the TTL
+CATALOG_TOMBSTONE_TTL = config('CATALOG_TOMBSTONE_TTL', default=30 * 24 * 3600, cast=int)
+CATALOG_SYNC_OVERLAP = config('CATALOG_SYNC_OVERLAP', default=60, cast=int)  # seconds re-sent to cover late commits
 
 
 # Password validation
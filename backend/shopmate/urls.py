@@ -2,12 +2,18 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+
+from core.views import db_pool_stats
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
     path('auth/', include('djoser.urls')),  # user management endpoints
     path('auth/', include('djoser.urls.authtoken')),  # token login/logout
+    path('internal/db-pool/', db_pool_stats, name='db-pool-stats'),  # staff only
 
 ]
+if settings.AUTH_MODE == 'jwt':
+    urlpatterns.append(path('auth/', include('core.jwt_urls')))  # jwt create/refresh/verify/logout
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -14,11 +14,11 @@ const RecentProducts = () => {
         const token = localStorage.getItem("token");
         if (!token) return;
 
-        const res = await axios.get(`${API_BASE}/products/?ordering=-created_at&limit=5`, {
+        const res = await axios.get(`${API_BASE}/products/?page_size=5`, {
           headers: { Authorization: `Token ${token}` },
         });
 
-        setRecentProducts(res.data || []);
+        setRecentProducts(Array.isArray(res.data) ? res.data : res.data.results || []);
       } catch (err) {
         console.error("Error fetching recent products:", err);
       } finally {
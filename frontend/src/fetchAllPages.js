@@ -0,0 +1,16 @@
+import axios from "axios";
+
+// List endpoints return cursor pages ({ next, results }); follow `next` until the end.
+export default async function fetchAllPages(url, config) {
+  const rows = [];
+  while (url) {
+    const res = await axios.get(url, config);
+    if (Array.isArray(res.data)) {
+      rows.push(...res.data);
+      break;
+    }
+    rows.push(...(res.data.results || []));
+    url = res.data.next;
+  }
+  return rows;
+}
@@ -186,16 +186,11 @@ const CreateInvoice = () => {
   const handleCreateInvoice = async () => {
   try {
     const token = localStorage.getItem("token");
-    const totals = calculateTotals();
-
-    const payload = {
-      total_amount: totals.total,
-      profit_amount: totals.totalProfit,
-    };
 
+    // the server computes total and profit from the sale items
     await axios.post(
       `http://localhost:8000/api/sales/${saleId}/confirm/`,
-      payload,
+      {},
       { headers: { Authorization: `Token ${token}` } }
     );
 
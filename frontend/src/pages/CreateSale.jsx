@@ -2,6 +2,7 @@ import React, { useState, useEffect } from "react";
 import Select from "react-select";
 import { FaPlus, FaMinus, FaTrash, FaPrint } from "react-icons/fa";
 import axios from "axios";
+import fetchAllPages from "../fetchAllPages";
 
 const CreateSale = () => {
   const user = JSON.parse(localStorage.getItem("user"));
@@ -21,11 +22,10 @@ const CreateSale = () => {
 
   // ✅ Fetch products from backend
   useEffect(() => {
-    axios
-      .get("http://localhost:8000/api/products/", {
-        headers: { Authorization: `Token ${token}` },
-      })
-      .then((res) => setProducts(res.data))
+    fetchAllPages("http://localhost:8000/api/products/", {
+      headers: { Authorization: `Token ${token}` },
+    })
+      .then(setProducts)
       .catch((err) => console.error(err));
   }, [token]);
 
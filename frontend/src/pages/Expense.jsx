@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from "react";
 import axios from "axios";
+import fetchAllPages from "../fetchAllPages";
 import { PlusCircle, Trash2, Pencil, Check, X } from "lucide-react";
 import { FaArrowLeft } from "react-icons/fa";
 import { Link } from "react-router-dom";
@@ -31,10 +32,10 @@ export default function Expense() {
         const token = localStorage.getItem("token");
         if (!token) return;
 
-        const res = await axios.get("http://localhost:8000/api/expenses/", {
+        const rows = await fetchAllPages("http://localhost:8000/api/expenses/", {
           headers: { Authorization: `Token ${token}` },
         });
-        setExpenses(res.data);
+        setExpenses(rows);
       } catch (error) {
         console.error("Error fetching expenses:", error);
       }
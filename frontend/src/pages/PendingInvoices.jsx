@@ -1,7 +1,7 @@
 import React, { useState, useMemo, useEffect } from "react";
 import { FaArrowLeft } from "react-icons/fa";
 import { Link } from "react-router-dom";
-import axios from "axios";
+import fetchAllPages from "../fetchAllPages";
 
 export default function PendingInvoices() {
   const [invoices, setInvoices] = useState([]);
@@ -14,14 +14,10 @@ export default function PendingInvoices() {
     const fetchInvoices = async () => {
       try {
         const token = localStorage.getItem("token");
-        const res = await axios.get("http://localhost:8000/api/sales/?status=pending", {
+        const salesData = await fetchAllPages("http://localhost:8000/api/sales/?status=pending", {
           headers: { Authorization: `Token ${token}` },
         });
 
-        const salesData = Array.isArray(res.data)
-          ? res.data
-          : res.data.results || [];
-
         const mapped = salesData.map((sale) => ({
           id: sale.id,
           customer: sale.customer_name || "Walk-in Customer",
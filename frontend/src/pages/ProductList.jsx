@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from "react";
 import axios from "axios";
+import fetchAllPages from "../fetchAllPages";
 import { useShopRole } from "../components/ShopRoleContext";
 import { FaSearch, FaEdit, FaTrash, FaSave, FaTimes } from "react-icons/fa";
 
@@ -25,10 +26,10 @@ const ProductList = () => {
     const fetchProducts = async () => {
       try {
         const token = localStorage.getItem("token");
-        const res = await axios.get("http://localhost:8000/api/products/", {
+        const rows = await fetchAllPages("http://localhost:8000/api/products/", {
           headers: { Authorization: `Token ${token}` },
         });
-        setProducts(res.data);
+        setProducts(rows);
       } catch (err) {
         console.error("Error fetching products:", err);
       }
@@ -1,7 +1,7 @@
 import React, { useState, useMemo, useEffect } from "react";
 import { FaArrowLeft } from "react-icons/fa";
 import { Link,useNavigate } from "react-router-dom";
-import axios from "axios";
+import fetchAllPages from "../fetchAllPages";
 
 export default function Statement() {
   const [invoices, setInvoices] = useState([]);
@@ -15,13 +15,10 @@ useEffect(() => {
   const fetchInvoices = async () => {
     try {
       const token = localStorage.getItem("token");
-      const res = await axios.get("http://localhost:8000/api/sales/", {
+      const salesData = await fetchAllPages("http://localhost:8000/api/sales/", {
         headers: { Authorization: `Token ${token}` },
       });
 
-      // If paginated, data will be inside res.data.results
-      const salesData = Array.isArray(res.data) ? res.data : res.data.results || [];
-
       const mapped = salesData.map((sale) => ({
         id: sale.id,
         customer: sale.customer_name || "Walk-in Customer",